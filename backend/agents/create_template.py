@@ -1,12 +1,13 @@
-import sqlite3
 import asyncio
 import json
+import os
+import sys
+import uuid
 from upload_text_api import upload_text_api
 from flask import g
 import flask_login
 from generate_exercise import generate_exercise
 
-import sqlite3
 import asyncio
 import json
 from upload_text_api import upload_text_api
@@ -14,60 +15,68 @@ from flask import g
 import flask_login
 from generate_exercise import generate_exercise
 
-def create_template(subject, topics, user_id):
-    conn = sqlite3.connect('instance/users.db')
-    cursor = conn.cursor()
+# Silnik bazy danych wspólny z backendem
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import get_engine
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
 
-    # count of exams in the database
-    countE = cursor.execute('SELECT COUNT(*) FROM exam').fetchone()[0]
+def intern_topic(conn, name):
+    # id tematu, tworzony przy pierwszym użyciu
+    topic_id = conn.execute(text('SELECT id FROM topic WHERE name = :name'), {'name': name}).scalar()
+    if topic_id is None:
+        try:
+            with conn.begin_nested():
+                conn.execute(text('INSERT INTO topic (name) VALUES (:name)'), {'name': name})
+        except IntegrityError:
+            pass  # inny proces dodał ten temat w międzyczasie
+        topic_id = conn.execute(text('SELECT id FROM topic WHERE name = :name'), {'name': name}).scalar()
+    return topic_id
 
-    # count of templates in the database
-    countT = cursor.execute('SELECT COUNT(*) FROM template').fetchone()[0]
-    
-    # pobieranie pytań
+def create_template(subject, topics, user_id):
+    # pobieranie pytań (przed otwarciem transakcji, żeby nie trzymać połączenia)
     ex = asyncio.run(generate_exercise(topics, subject))
     ex = json.loads(ex)
     questions = ex["questions"]
 
-    # dodawanie pytań
-    for idx, question in enumerate(questions):
-        cursor.execute('''
-            INSERT INTO question (id, type, answer, points, topic, options, solution, exam_id)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            idx + countE * 100,  # Unikalne id dla pytania (przykładowa strategia)
-            question["type"],
-            question["answer"],
-            question["points"],
-            question["topic"],
-            json.dumps(question["options"]),
-            json.dumps(question["solution"]),
-            countE  # exam_id przypisany do egzaminu
-        ))
-        print("QUESTION dodany")
-
-    # zbieranie id pytań do egzaminu
-    cursor.execute('SELECT id FROM question WHERE exam_id = ?', (countE,))
-    question_ids = cursor.fetchall()
-    question_ids = [str(q[0]) for q in question_ids]
-    questions_str = ",".join(question_ids)
-
-    # dodanie egzaminu
-    cursor.execute('''
-        INSERT INTO exam (id, subject, questions)
-        VALUES (?, ?, ?)
-    ''', (countE, ex["template"], questions_str))
-    print("EXAM dodany")
-
-    # dodanie szablonu
-    cursor.execute('''
-        INSERT INTO template (id, subject, topics, user_id)
-        VALUES (?, ?, ?, ?)
-    ''', (countT, subject, topics, user_id))
-    print("TEMPLATE dodany")
+    with get_engine().begin() as conn:
+        # dodanie szablonu
+        template_id = conn.execute(text('''
+            INSERT INTO template (subject, topics, user_id, stamp)
+            VALUES (:subject, :topics, :user_id, :stamp)
+            RETURNING id
+        '''), {'subject': subject, 'topics': topics, 'user_id': user_id, 'stamp': uuid.uuid4().hex}).scalar()
+        print("TEMPLATE dodany")
 
-    conn.commit()
-    conn.close()
+        # powiązanie szablonu z tematami
+        for name in dict.fromkeys(t.strip() for t in topics.split(',') if t.strip()):
+            conn.execute(text('INSERT INTO template_topic (template_id, topic_id) VALUES (:template_id, :topic_id)'),
+                         {'template_id': template_id, 'topic_id': intern_topic(conn, name)})
 
+        # dodanie egzaminu
+        exam_id = conn.execute(text('''
+            INSERT INTO exam (subject, template_id)
+            VALUES (:subject, :template_id)
+            RETURNING id
+        '''), {'subject': ex["template"], 'template_id': template_id}).scalar()
+        print("EXAM dodany")
 
+        # dodawanie pytań
+        conn.execute(text('''
+            INSERT INTO question (type, answer, points, topic, topic_id, options, solution, exam_id)
+            VALUES (:type, :answer, :points, :topic, :topic_id, :options, :solution, :exam_id)
+        '''), [{
+            'type': question["type"],
+            'answer': question["answer"],
+            'points': question["points"],
+            'topic': question["topic"],
+            'topic_id': intern_topic(conn, question["topic"]),
+            'options': json.dumps(question["options"]),
+            'solution': json.dumps(question["solution"]),
+            'exam_id': exam_id
+        } for question in questions])
+        print(f"{len(questions)} QUESTION dodanych")
 
+        # nowy szablon zmienia listy użytkownika, więc ich ETagi muszą się zmienić
+        conn.execute(text('UPDATE "user" SET data_version = data_version + 1 WHERE id = :user_id'),
+                     {'user_id': user_id})
@@ -0,0 +1,224 @@
+from collections import Counter
+from datetime import datetime, timezone
+from sqlalchemy import Boolean, bindparam, case, event, func, insert, select, update
+
+from main import db
+from models import AnswerEvent, DailyTopicStat, Stat, Template
+from topics import intern_topics
+
+# A new stat starts in the middle of the 1-10 scale
+INITIAL_DIFFICULTY = 5.0
+
+def _next_difficulty(difficulty, is_correct):
+    """Python version of the SQL below, for the first answer of a topic."""
+    if is_correct:
+        # If answer is correct, decrease difficulty (user understands better)
+        difficulty = max(1.0, difficulty - 0.5)
+        return difficulty, "decreasing" if difficulty < 5.0 else "stable"
+    # If answer is wrong or clarification requested, increase difficulty
+    difficulty = min(10.0, difficulty + 1.0)
+    return difficulty, "increasing" if difficulty > 5.0 else "stable"
+
+def _stat_changes():
+    """SET clause that applies one outcome to the stored stat row, evaluated by the database."""
+    is_correct = bindparam('is_correct', type_=Boolean)
+    difficulty = Stat.__table__.c.difficulty
+    return {
+        'difficulty': case(
+            (is_correct, case((difficulty - 0.5 < 1.0, 1.0), else_=difficulty - 0.5)),
+            else_=case((difficulty + 1.0 > 10.0, 10.0), else_=difficulty + 1.0)
+        ),
+        # Both branches compare the old value, which SET expressions always see
+        'trend': case(
+            (is_correct, case((difficulty - 0.5 < 5.0, 'decreasing'), else_='stable')),
+            else_=case((difficulty + 1.0 > 5.0, 'increasing'), else_='stable')
+        ),
+    }
+
+def _dialect_insert(session):
+    """Return the dialect's insert() that supports ON CONFLICT, or None if it has none."""
+    dialect = session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        return None
+    return dialect_insert
+
+def _stat_upsert(session):
+    """Return an INSERT ... ON CONFLICT statement for stats, or None if the dialect has none."""
+    dialect_insert = _dialect_insert(session)
+    if dialect_insert is None:
+        return None
+
+    return dialect_insert(Stat.__table__).values(
+        template_id=bindparam('stat_template_id'),
+        user_id=bindparam('stat_user_id'),
+        topic_id=bindparam('stat_topic_id'),
+        topic=bindparam('stat_topic'),
+        difficulty=bindparam('first_difficulty'),
+        trend=bindparam('first_trend'),
+    ).on_conflict_do_update(
+        index_elements=['template_id', 'topic_id'],
+        set_=_stat_changes()
+    )
+
+def _apply_to_stats(session, rows):
+    statement = _stat_upsert(session)
+    if statement is not None:
+        if not session.get_bind().dialect.use_insertmanyvalues_wo_returning:
+            session.execute(statement, rows)
+            return
+        # Dialects like psycopg2 would fold the rows into one multi-VALUES
+        # INSERT, which cannot update a row twice and shares one is_correct
+        for row in rows:
+            session.execute(statement, row)
+        return
+
+    # No upsert: update in place, and insert the stats that do not exist yet
+    table = Stat.__table__
+    changes = update(table).where(
+        table.c.template_id == bindparam('stat_template_id'),
+        table.c.topic_id == bindparam('stat_topic_id')
+    ).values(_stat_changes())
+    for row in rows:
+        if session.execute(changes, row).rowcount == 0:
+            session.execute(insert(table), {
+                'template_id': row['stat_template_id'],
+                'user_id': row['stat_user_id'],
+                'topic_id': row['stat_topic_id'],
+                'topic': row['stat_topic'],
+                'difficulty': row['first_difficulty'],
+                'trend': row['first_trend'],
+            })
+
+def _current_difficulty():
+    """Scalar subquery reading the stat a rollup row belongs to, as stored at that point."""
+    stat = Stat.__table__
+    return select(stat.c.difficulty).where(
+        stat.c.template_id == bindparam('rollup_template_id'),
+        stat.c.topic_id == bindparam('rollup_topic_id')
+    ).scalar_subquery()
+
+def _rollup_keys(table):
+    return (
+        (table.c.user_id == bindparam('rollup_user_id'))
+        & (table.c.day == bindparam('rollup_day'))
+        & (table.c.template_id == bindparam('rollup_template_id'))
+        & (table.c.topic_id == bindparam('rollup_topic_id'))
+    )
+
+def _count_in_rollups(session, rows):
+    """Add the answers to the day's rollup rows, before the stats change.
+
+    A new row records the stat's difficulty at this point as the day's
+    opening difficulty, so the trend of a single day can be told.
+    """
+    table = DailyTopicStat.__table__
+    opening = func.coalesce(_current_difficulty(), INITIAL_DIFFICULTY)
+    values = dict(
+        user_id=bindparam('rollup_user_id'),
+        day=bindparam('rollup_day'),
+        template_id=bindparam('rollup_template_id'),
+        topic_id=bindparam('rollup_topic_id'),
+        attempts=bindparam('rollup_attempts'),
+        correct=bindparam('rollup_correct'),
+        difficulty=opening,
+        opening_difficulty=opening,
+    )
+
+    dialect_insert = _dialect_insert(session)
+    if dialect_insert is not None:
+        statement = dialect_insert(table).values(**values)
+        statement = statement.on_conflict_do_update(
+            index_elements=['user_id', 'day', 'template_id', 'topic_id'],
+            set_={
+                'attempts': table.c.attempts + statement.excluded.attempts,
+                'correct': table.c.correct + statement.excluded.correct,
+            }
+        )
+        session.execute(statement, rows)
+        return
+
+    changes = update(table).where(_rollup_keys(table)).values(
+        attempts=table.c.attempts + bindparam('rollup_attempts'),
+        correct=table.c.correct + bindparam('rollup_correct')
+    )
+    for row in rows:
+        if session.execute(changes, row).rowcount == 0:
+            session.execute(insert(table).values(**values), row)
+
+def _close_rollups(session, rows):
+    """Copy the stats' difficulty after the answers onto the rollup rows."""
+    table = DailyTopicStat.__table__
+    session.execute(update(table).where(_rollup_keys(table)).values(difficulty=_current_difficulty()), rows)
+
+def record_answers(user_id, template_id, outcomes, kind='answer', session=None):
+    """Log outcomes as answer events and fold them into the template's stats and daily rollups.
+
+    outcomes is a list of (question, is_correct); question needs id, exam_id
+    and topic. The events are appended and each stat and rollup row is changed
+    with an atomic upsert computed from its stored value, so concurrent
+    answers to the same topic never overwrite each other. Runs in the
+    caller's transaction.
+    """
+    session = session or db.session
+    if not outcomes:
+        return
+
+    names = list(dict.fromkeys(question.topic for question, _ in outcomes))
+    topic_ids = dict(zip(names, intern_topics(names, session)))
+
+    session.execute(insert(AnswerEvent), [{
+        'user_id': user_id,
+        'template_id': template_id,
+        'exam_id': question.exam_id,
+        'question_id': question.id,
+        'topic_id': topic_ids[question.topic],
+        'kind': kind,
+        'is_correct': is_correct,
+    } for question, is_correct in outcomes])
+
+    # One rollup row per topic, counted before the stats change so a new row can record where the day started
+    attempts = Counter(question.topic for question, _ in outcomes)
+    correct = Counter(question.topic for question, is_correct in outcomes if is_correct)
+    day = datetime.now(timezone.utc).date()
+    rollup_rows = [{
+        'rollup_user_id': user_id,
+        'rollup_day': day,
+        'rollup_template_id': template_id,
+        'rollup_topic_id': topic_ids[topic],
+        'rollup_attempts': attempts[topic],
+        'rollup_correct': correct[topic],
+    } for topic in names]
+    _count_in_rollups(session, rollup_rows)
+
+    rows = []
+    for question, is_correct in outcomes:
+        first_difficulty, first_trend = _next_difficulty(INITIAL_DIFFICULTY, is_correct)
+        rows.append({
+            'stat_template_id': template_id,
+            'stat_user_id': user_id,
+            'stat_topic_id': topic_ids[question.topic],
+            'stat_topic': question.topic,
+            'first_difficulty': first_difficulty,
+            'first_trend': first_trend,
+            'is_correct': is_correct,
+        })
+    # One execution per outcome, in order, so several answers to one topic compound like separate requests
+    _apply_to_stats(session, rows)
+
+    # Then the rollups pick up the stats' final difficulty
+    _close_rollups(session, rollup_rows)
+
+@event.listens_for(db.session, 'before_flush')
+def _fill_stat_owner(session, flush_context, instances):
+    """Copy the template's owner onto stats created through the ORM."""
+    pending = [obj for obj in session.new if isinstance(obj, Stat) and obj.user_id is None]
+    if pending:
+        template_ids = {obj.template_id for obj in pending}
+        with session.no_autoflush:
+            owners = dict(session.execute(select(Template.id, Template.user_id).where(Template.id.in_(template_ids))).all())
+        for obj in pending:
+            obj.user_id = owners.get(obj.template_id)
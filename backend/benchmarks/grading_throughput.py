@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Measure how many answers per second the grading module checks, against the
+plain lower() comparison it replaced.
+
+Questions mix open text answers with Polish diacritics, numeric answers given
+as fractions or decimals, and closed questions answered by option letter.
+"cold" compiles every grader first, "warm" reuses the cached graders like a
+running server does.
+
+    python benchmarks/grading_throughput.py --questions 500 --answers 200000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from collections import namedtuple
+
+# Add parent directory to path so we can import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from grading import compile_grader, grade_many
+
+Question = namedtuple('Question', 'answer options')
+
+WORDS = ['zażółć', 'gęślą', 'jaźń', 'łódź', 'mitochondria', 'fotosynteza', 'całka', 'pochodna']
+
+def make_questions(count):
+    questions = []
+    for i in range(count):
+        kind = i % 3
+        if kind == 0:
+            questions.append(Question(' '.join(random.sample(WORDS, 3)).capitalize() + f' {i}', None))
+        elif kind == 1:
+            questions.append(Question(f'{i + 1}/{random.choice([2, 4, 5, 8])}', None))
+        else:
+            options = [str(random.randrange(1000)) for _ in range(4)]
+            questions.append(Question(random.choice(options), json.dumps(options)))
+    return questions
+
+def make_answers(questions, count):
+    answers = []
+    for _ in range(count):
+        question = random.choice(questions)
+        if question.options:
+            submitted = random.choice('abcd')
+        elif '/' in question.answer:
+            numerator, denominator = question.answer.split('/')
+            submitted = str(int(numerator) / int(denominator)).replace('.', ',')
+        else:
+            submitted = '  ' + question.answer.upper() + '. '
+        answers.append((question, submitted))
+    return answers
+
+def run(label, grade, answers):
+    start = time.perf_counter()
+    correct = sum(grade(answers))
+    elapsed = time.perf_counter() - start
+    print(f"{label:>8}: {len(answers) / elapsed:12.0f} grades/s  {correct:8d} correct")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--questions', type=int, default=500)
+    parser.add_argument('--answers', type=int, default=200000)
+    args = parser.parse_args()
+
+    random.seed(0)
+    questions = make_questions(args.questions)
+    answers = make_answers(questions, args.answers)
+
+    print(f"{args.questions} questions, {args.answers} answers")
+    run('lower()', lambda pairs: [s.lower() == q.answer.lower() for q, s in pairs], answers)
+    compile_grader.cache_clear()
+    run('cold', grade_many, answers)
+    run('warm', grade_many, answers)
+
+if __name__ == '__main__':
+    main()
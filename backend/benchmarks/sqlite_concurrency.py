@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Compare SQLite read/write throughput under concurrent load, with SQLite's
+default settings and with the pragmas the backend applies (database.py).
+
+Each reader and writer is a separate process, like gunicorn sync workers.
+Writers mimic update_stats: append an answer event, change the stat in
+place with one UPDATE, and commit. Readers mimic the template/stats GET routes.
+
+    python benchmarks/sqlite_concurrency.py --readers 4 --writers 2 --seconds 5
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+# Add parent directory to path so we can import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import apply_sqlite_pragmas, sqlite_pragmas
+
+TEMPLATES = 200
+TOPICS = 20
+
+def setup(path):
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE stat (
+            id INTEGER PRIMARY KEY,
+            template_id INTEGER NOT NULL,
+            topic_id INTEGER NOT NULL,
+            difficulty FLOAT NOT NULL
+        );
+        CREATE UNIQUE INDEX ix_stat_template_id_topic_id ON stat (template_id, topic_id);
+        CREATE TABLE answer_event (
+            id INTEGER PRIMARY KEY,
+            template_id INTEGER NOT NULL,
+            topic_id INTEGER NOT NULL,
+            is_correct BOOLEAN NOT NULL
+        );
+    ''')
+    conn.executemany(
+        'INSERT INTO stat (template_id, topic_id, difficulty) VALUES (?, ?, 5.0)',
+        [(t, topic) for t in range(TEMPLATES) for topic in range(TOPICS)]
+    )
+    conn.commit()
+    conn.close()
+
+def connect(path, pragmas):
+    # Default sqlite3 timeout is 5s; keep it for both runs so only the pragmas differ
+    conn = sqlite3.connect(path, timeout=5)
+    if pragmas:
+        apply_sqlite_pragmas(conn, pragmas)
+    return conn
+
+def reader(path, pragmas, deadline, results):
+    conn = connect(path, pragmas)
+    ops = errors = 0
+    while time.time() < deadline:
+        try:
+            conn.execute(
+                'SELECT topic_id, difficulty FROM stat WHERE template_id = ?',
+                (random.randrange(TEMPLATES),)
+            ).fetchall()
+            ops += 1
+        except sqlite3.OperationalError:
+            errors += 1
+    results.put(('read', ops, errors))
+
+def writer(path, pragmas, deadline, results):
+    conn = connect(path, pragmas)
+    ops = errors = 0
+    while time.time() < deadline:
+        key = (random.randrange(TEMPLATES), random.randrange(TOPICS))
+        try:
+            conn.execute('INSERT INTO answer_event (template_id, topic_id, is_correct) VALUES (?, ?, 0)', key)
+            conn.execute(
+                'UPDATE stat SET difficulty = MIN(10.0, difficulty + 1.0) WHERE template_id = ? AND topic_id = ?', key
+            )
+            conn.commit()
+            ops += 1
+        except sqlite3.OperationalError:
+            conn.rollback()
+            errors += 1
+    results.put(('write', ops, errors))
+
+def run(label, pragmas, readers, writers, seconds):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        setup(path)
+        if pragmas:
+            # journal_mode is stored in the file, so set it before the workers start
+            conn = sqlite3.connect(path)
+            apply_sqlite_pragmas(conn, pragmas)
+            conn.close()
+
+        results = multiprocessing.Queue()
+        deadline = time.time() + seconds
+        processes = [
+            multiprocessing.Process(target=reader, args=(path, pragmas, deadline, results))
+            for _ in range(readers)
+        ] + [
+            multiprocessing.Process(target=writer, args=(path, pragmas, deadline, results))
+            for _ in range(writers)
+        ]
+        for process in processes:
+            process.start()
+        totals = {'read': [0, 0], 'write': [0, 0]}
+        for _ in processes:
+            kind, ops, errors = results.get()
+            totals[kind][0] += ops
+            totals[kind][1] += errors
+        for process in processes:
+            process.join()
+
+    print(f"{label:>8}: {totals['read'][0] / seconds:10.0f} reads/s  "
+          f"{totals['write'][0] / seconds:8.0f} writes/s  "
+          f"{totals['read'][1] + totals['write'][1]:5d} lock errors")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    print(f"{args.readers} readers, {args.writers} writers, {args.seconds:g}s per run")
+    run('default', None, args.readers, args.writers, args.seconds)
+    run('tuned', sqlite_pragmas(), args.readers, args.writers, args.seconds)
+
+if __name__ == '__main__':
+    main()
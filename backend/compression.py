@@ -0,0 +1,99 @@
+import gzip
+from flask import request
+from flask_jwt_extended import get_jwt_identity
+
+try:
+    import brotli
+except ImportError:  # Optional; only gzip is offered without it
+    brotli = None
+
+from cache import TTLCache
+
+# Every encoding a compressed response may carry, in the order they are preferred
+ENCODINGS = ('br', 'gzip')
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'text/html', 'text/plain')
+
+# Middle of the range: bodies are compressed while the client waits, and cached by ETag afterwards
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+def available_encoders():
+    """Return {encoding: function compressing bytes} for the encodings installed here, preferred first."""
+    encoders = {}
+    if brotli is not None:
+        encoders['br'] = lambda data: brotli.compress(data, quality=BROTLI_QUALITY)
+    # mtime=0 so the same body always compresses to the same bytes
+    encoders['gzip'] = lambda data: gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    return encoders
+
+def etag_variants(etag):
+    """Return an ETag and the ETags of its compressed representations.
+
+    A compressed body is a different representation, so it is sent with the
+    encoding appended to the ETag. If-None-Match may carry any of them.
+    """
+    return [etag] + [f'{etag}-{encoding}' for encoding in ENCODINGS]
+
+def choose_encoding(accept_encodings, encoders):
+    """Return the encoding the client rates highest, ties going to the order of encoders, or None."""
+    best, best_quality = None, 0
+    for encoding in encoders:
+        quality = accept_encodings[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+def _identity():
+    """Return the identity of the request's verified JWT, or None if it carried none."""
+    try:
+        return get_jwt_identity()
+    except RuntimeError:  # The route does not check for a JWT
+        return None
+
+def compress_response(response, encoders, cache, min_size):
+    """Compress a finished response if the client accepts it and it is worth it.
+
+    Bodies with a strong ETag are cached per user, URL, ETag and encoding, so a
+    payload that has not changed is compressed once however often it is
+    served. An ETag only tells versions of one URL apart, so it alone would
+    let two users' payloads share a cache entry.
+    """
+    if response.status_code != 200 or response.direct_passthrough or response.is_streamed \
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+    response.vary.add('Accept-Encoding')
+
+    encoding = choose_encoding(request.accept_encodings, encoders)
+    if encoding is None or (response.content_length or 0) < min_size:
+        return response
+
+    etag, weak = response.get_etag()
+    key = (_identity(), request.full_path, etag, encoding) if etag and not weak else None
+    body = cache.get(key) if key else None
+    if body is None:
+        body = encoders[encoding](response.get_data())
+        if key:
+            cache.set(key, body)
+
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    if etag:
+        response.set_etag(f'{etag}-{encoding}', weak)
+    return response
+
+def install_compression(app):
+    """Compress the app's responses as negotiated by Accept-Encoding.
+
+    Bodies under COMPRESS_MIN_SIZE bytes are sent as they are, since the
+    headers would outweigh the saving. Returns the cache of compressed bodies.
+    """
+    encoders = available_encoders()
+    cache = TTLCache(maxsize=app.config.get('COMPRESS_CACHE_SIZE', 256), ttl=app.config.get('COMPRESS_CACHE_TTL_SECONDS', 300))
+    app.extensions['compression_cache'] = cache
+
+    @app.after_request
+    def _compress(response):
+        return compress_response(response, encoders, cache, app.config.get('COMPRESS_MIN_SIZE', 1024))
+
+    return cache
@@ -0,0 +1,100 @@
+import os
+import re
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+
+# Same file Flask uses as app.instance_path, independent of the working directory
+DEFAULT_DATABASE_URL = 'sqlite:///' + os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'users.db')
+
+# Tuned for several gunicorn workers sharing one SQLite file: WAL lets readers
+# carry on while a writer commits, and busy_timeout makes writers wait for the
+# lock instead of failing with "database is locked".
+SQLITE_PRAGMA_DEFAULTS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',    # Safe with WAL; only the last commits can be lost on power failure
+    'cache_size': '-20000',     # Negative means KiB, so 20 MB of page cache per connection
+    'mmap_size': '268435456',   # 256 MB
+    'busy_timeout': '5000',     # Milliseconds
+    'temp_store': 'MEMORY',
+}
+
+_PRAGMA_VALUE = re.compile(r'^-?\w+$')
+
+def sqlite_pragmas(environ=os.environ):
+    """Return the pragmas to apply, with SQLITE_<NAME> environment overrides."""
+    pragmas = {}
+    for name, default in SQLITE_PRAGMA_DEFAULTS.items():
+        value = str(environ.get(f'SQLITE_{name.upper()}', default))
+        if not _PRAGMA_VALUE.match(value):
+            raise ValueError(f'Invalid value for SQLITE_{name.upper()}: {value!r}')
+        pragmas[name] = value
+    return pragmas
+
+def apply_sqlite_pragmas(dbapi_connection, pragmas):
+    """Run PRAGMA statements on a freshly opened sqlite3 connection."""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+    finally:
+        cursor.close()
+
+def install_sqlite_pragmas(engine, pragmas):
+    """Apply the pragmas to every connection the engine opens. No-op for other databases."""
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_connection, connection_record):
+        apply_sqlite_pragmas(dbapi_connection, pragmas)
+
+def database_url(environ=os.environ):
+    """Return DATABASE_URL, or the SQLite file in the instance folder."""
+    url = environ.get('DATABASE_URL', DEFAULT_DATABASE_URL)
+    # Hosting providers still hand out the scheme SQLAlchemy dropped in 1.4
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+def _is_true(value):
+    return str(value).lower() in ('1', 'true', 'yes', 'on')
+
+def engine_options(url, environ=os.environ):
+    """Return create_engine() pool settings from the DB_POOL_* variables.
+
+    Size the pool to the number of threads per worker: each gunicorn worker
+    gets its own pool after forking.
+    """
+    options = {
+        'pool_pre_ping': _is_true(environ.get('DB_POOL_PRE_PING', 'true')),
+        'pool_recycle': int(environ.get('DB_POOL_RECYCLE', 1800)),
+    }
+    # In-memory SQLite keeps one connection per thread and takes no sizing options
+    parsed = make_url(url)
+    if parsed.get_backend_name() == 'sqlite' and parsed.database in (None, '', ':memory:'):
+        return options
+
+    options.update({
+        'pool_size': int(environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(environ.get('DB_POOL_TIMEOUT', 30)),
+    })
+    return options
+
+def create_engine_from_env(environ=os.environ):
+    """Create an engine configured exactly like the web app's."""
+    url = database_url(environ)
+    engine = create_engine(url, **engine_options(url, environ))
+    install_sqlite_pragmas(engine, sqlite_pragmas(environ))
+    return engine
+
+_engine = None
+_engine_pid = None
+
+def get_engine():
+    """Return this process's shared engine for code running outside the Flask app."""
+    global _engine, _engine_pid
+    if _engine is None or _engine_pid != os.getpid():
+        _engine = create_engine_from_env()
+        _engine_pid = os.getpid()
+    return _engine
@@ -0,0 +1,132 @@
+import threading
+import click
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import delete, select, update
+
+from main import db
+from models import User, Template, Exam, Question, Stat, AnswerEvent, DailyTopicStat, template_topic
+
+# One worker, so background deletes queue up instead of competing for the write lock
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='template-delete')
+
+# Futures of queued and running deletes by template id, so one template is never queued twice
+_pending = {}
+_pending_lock = threading.Lock()
+
+def _child_tables(template_ids):
+    """(table, id column, subquery of the ids to delete) for everything that hangs off the templates.
+
+    Ordered so rows are removed before the rows they reference.
+    """
+    return [
+        (AnswerEvent, AnswerEvent.id, select(AnswerEvent.id).where(AnswerEvent.template_id.in_(template_ids))),
+        (DailyTopicStat, DailyTopicStat.id, select(DailyTopicStat.id).where(DailyTopicStat.template_id.in_(template_ids))),
+        (Stat, Stat.id, select(Stat.id).where(Stat.template_id.in_(template_ids))),
+        (Question, Question.id, select(Question.id)
+            .join(Exam, Question.exam_id == Exam.id)
+            .where(Exam.template_id.in_(template_ids))),
+        (Exam, Exam.id, select(Exam.id).where(Exam.template_id.in_(template_ids))),
+    ]
+
+def delete_templates(template_ids, session=None):
+    """Delete templates and everything under them with one DELETE per table.
+
+    Runs in the caller's transaction; nothing is loaded into the session.
+    """
+    session = session or db.session
+    template_ids = list(template_ids)
+    if not template_ids:
+        return
+
+    for model, id_column, ids in _child_tables(template_ids):
+        session.execute(delete(model).where(id_column.in_(ids)))
+    session.execute(delete(template_topic).where(template_topic.c.template_id.in_(template_ids)))
+    session.execute(delete(Template).where(Template.id.in_(template_ids)))
+
+def _bump_versions(session, template_id):
+    """Change the ETags of the template's payloads, its exams and its owner's lists, like template.bump_versions."""
+    owner_id = select(Template.user_id).where(Template.id == template_id).scalar_subquery()
+    session.execute(update(User).where(User.id == owner_id).values(data_version=User.data_version + 1))
+    session.execute(update(Template).where(Template.id == template_id).values(version=Template.version + 1))
+    session.execute(update(Exam).where(Exam.template_id == template_id).values(version=Exam.version + 1))
+
+def purge_template_children(template_id, batch_size, session=None):
+    """Delete the rows under a template in batches of batch_size, committing after each.
+
+    Short transactions keep the write lock free for other requests between
+    batches. Each batch bumps the versions, so no ETag or cached body from
+    before it is served as current. The template itself is left for
+    delete_templates to remove. Returns the number of rows deleted.
+    """
+    session = session or db.session
+    deleted = 0
+    for model, id_column, ids in _child_tables([template_id]):
+        while True:
+            count = session.execute(delete(model).where(id_column.in_(ids.limit(batch_size)))).rowcount
+            if count:
+                _bump_versions(session, template_id)
+            session.commit()
+            deleted += count
+            if count < batch_size:
+                break
+    return deleted
+
+def delete_template_in_background(app, template_id, on_deleted=None):
+    """Purge a template in batches on the background worker, then delete it.
+
+    The caller flags the template as deleting first, so that
+    resume_template_deletes can finish the job after a restart. on_deleted
+    runs in the final transaction, after the template row is gone.
+    Returns a Future for the number of rows deleted; the existing one if the
+    template is already queued.
+    """
+    batch_size = app.config.get('TEMPLATE_DELETE_BATCH_SIZE', 1000)
+
+    def run():
+        with app.app_context():
+            try:
+                deleted = purge_template_children(template_id, batch_size)
+                # Catches rows added while the batches ran
+                delete_templates([template_id])
+                if on_deleted:
+                    on_deleted()
+                db.session.commit()
+                app.logger.info('Deleted template %d and %d rows under it', template_id, deleted)
+                return deleted
+            except Exception:
+                db.session.rollback()
+                app.logger.exception('Deleting template %d failed', template_id)
+                raise
+            finally:
+                db.session.remove()
+                with _pending_lock:
+                    _pending.pop(template_id, None)
+
+    with _pending_lock:
+        if template_id not in _pending:
+            _pending[template_id] = _executor.submit(run)
+        return _pending[template_id]
+
+def flagged_template_ids(session=None):
+    """Return the ids of templates whose background delete has not finished."""
+    session = session or db.session
+    return [template_id for (template_id,) in session.query(Template.id).filter(Template.deleting)]
+
+def resume_template_deletes(app):
+    """Restart background deletes that a stopped worker left unfinished. Returns their Futures."""
+    with app.app_context():
+        template_ids = flagged_template_ids()
+        db.session.remove()
+    for template_id in template_ids:
+        app.logger.info('Resuming the delete of template %d', template_id)
+    return [delete_template_in_background(app, template_id) for template_id in template_ids]
+
+@click.command('resume-template-deletes')
+@with_appcontext
+def resume_template_deletes_command():
+    """Finish the background deletes of templates still flagged as deleting."""
+    futures = resume_template_deletes(current_app._get_current_object())
+    deleted = sum(future.result() for future in futures)
+    click.echo(f'Deleted {len(futures)} templates and {deleted} rows under them')
@@ -0,0 +1,133 @@
+import zlib
+import click
+from flask import Blueprint, Response, request, current_app, stream_with_context
+from flask.cli import with_appcontext
+from flask_jwt_extended import jwt_required, current_user
+
+from json_provider import raw_json
+
+export_bp = Blueprint('export', __name__)
+
+# Bytes of NDJSON gathered before a chunk is written out or compressed
+CHUNK_SIZE = 64 * 1024
+GZIP_LEVEL = 6
+
+# Import models after creating blueprint to avoid circular imports
+from main import db
+from models import User, Template, Exam, Question, Stat
+
+def export_records(user_id, batch_size=1000):
+    """Yield every template, exam, question and stat of a user as one dict each.
+
+    Each dict names its kind under "record". Rows are streamed from the
+    database batch_size at a time, so memory use does not grow with the
+    amount of data. Answers and solutions are left out, as in the read routes.
+    """
+    templates = db.session.query(Template.id, Template.subject, Template.topics) \
+        .filter(Template.user_id == user_id, Template.deleting.is_(False)) \
+        .order_by(Template.id)
+    for row in templates.yield_per(batch_size):
+        yield {'record': 'template', 'id': row.id, 'subject': row.subject, 'topics': row.topics}
+
+    exams = db.session.query(Exam.id, Exam.template_id, Exam.subject) \
+        .join(Template, Exam.template_id == Template.id) \
+        .filter(Template.user_id == user_id, Template.deleting.is_(False)) \
+        .order_by(Template.id, Exam.id)
+    for row in exams.yield_per(batch_size):
+        yield {'record': 'exam', 'id': row.id, 'template_id': row.template_id, 'subject': row.subject}
+
+    questions = db.session.query(
+            Question.id, Question.exam_id, Question.type, Question.topic, Question.points, Question.options
+        ) \
+        .join(Exam, Question.exam_id == Exam.id) \
+        .join(Template, Exam.template_id == Template.id) \
+        .filter(Template.user_id == user_id, Template.deleting.is_(False)) \
+        .order_by(Template.id, Exam.id, Question.id)
+    for row in questions.yield_per(batch_size):
+        yield {
+            'record': 'question',
+            'id': row.id,
+            'exam_id': row.exam_id,
+            'type': row.type,
+            'topic': row.topic,
+            'points': row.points,
+            'options': raw_json(row.options)
+        }
+
+    stats = db.session.query(Stat.id, Stat.template_id, Stat.topic, Stat.difficulty, Stat.trend) \
+        .join(Template, Stat.template_id == Template.id) \
+        .filter(Template.user_id == user_id, Template.deleting.is_(False)) \
+        .order_by(Template.id, Stat.id)
+    for row in stats.yield_per(batch_size):
+        yield {
+            'record': 'stat',
+            'id': row.id,
+            'template_id': row.template_id,
+            'topic': row.topic,
+            'difficulty': row.difficulty,
+            'trend': row.trend
+        }
+
+def ndjson_chunks(records, json_provider):
+    """Encode records one per line and yield the lines as UTF-8 chunks of about CHUNK_SIZE bytes."""
+    lines = []
+    size = 0
+    for record in records:
+        line = json_provider.dumps(record).encode() + b'\n'
+        lines.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield b''.join(lines)
+            lines = []
+            size = 0
+    if lines:
+        yield b''.join(lines)
+
+def gzip_chunks(chunks, level=GZIP_LEVEL):
+    """Compress a stream of byte chunks into one gzip stream as they arrive."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+def export_stream(user_id, compress=False):
+    """Return the user's export as an iterator of (optionally gzipped) NDJSON byte chunks."""
+    records = export_records(user_id, current_app.config.get('EXPORT_BATCH_SIZE', 1000))
+    chunks = ndjson_chunks(records, current_app.json)
+    return gzip_chunks(chunks) if compress else chunks
+
+@export_bp.route('/export', methods=['GET'])
+@jwt_required()
+def export_data():
+    """Stream all of the current user's templates, exams, questions and stats as NDJSON.
+
+    Compressed with gzip when the client accepts it.
+    """
+    compress = request.accept_encodings['gzip'] > 0
+    # Rows are read while the body is sent, so the request context has to outlive the view
+    response = Response(
+        stream_with_context(export_stream(current_user.id, compress)),
+        mimetype='application/x-ndjson'
+    )
+    response.headers['Content-Disposition'] = 'attachment; filename="export.ndjson"'
+    response.headers['Vary'] = 'Accept-Encoding'
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+@click.command('export-data')
+@click.argument('username')
+@click.option('--output', '-o', type=click.Path(dir_okay=False, writable=True), help='Defaults to standard output.')
+@click.option('--gzip', 'compress', is_flag=True, help='Compress the output with gzip.')
+@with_appcontext
+def export_data_command(username, output, compress):
+    """Write a user's templates, exams, questions and stats as NDJSON."""
+    user_id = db.session.query(User.id).filter(User.username == username).scalar()
+    if user_id is None:
+        raise click.ClickException(f'No user named {username}')
+
+    with click.open_file(output or '-', 'wb') as f:
+        for chunk in export_stream(user_id, compress):
+            f.write(chunk)
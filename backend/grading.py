@@ -0,0 +1,135 @@
+import json
+import re
+import unicodedata
+from fractions import Fraction
+from functools import lru_cache
+
+# Letters that NFKD does not split into a base letter and a combining mark
+_EXTRA_FOLDS = str.maketrans({'ł': 'l', 'Ł': 'L', 'đ': 'd', 'Đ': 'D', 'ø': 'o', 'Ø': 'O'})
+_WHITESPACE = re.compile(r'\s+')
+_DECIMAL = re.compile(r'^[+-]?(\d+([.,]\d*)?|[.,]\d+)$')
+_FRACTION = re.compile(r'^([+-]?\d+)\s*/\s*(\d+)$')
+# "b", "b)", "(b)", "b." or "b:" for the second option
+_OPTION_LETTER = re.compile(r'^\(?([a-z])[).:]?$')
+
+def fold_text(value):
+    """Fold case, diacritics and whitespace, and drop trailing punctuation.
+
+    "  Łódź.  " and "lodz" fold to the same string.
+    """
+    value = str(value)
+    if not value.isascii():
+        value = unicodedata.normalize('NFKD', value.translate(_EXTRA_FOLDS))
+        value = ''.join(ch for ch in value if not unicodedata.combining(ch))
+    value = _WHITESPACE.sub(' ', value.casefold()).strip()
+    return value.rstrip('.,;:!?').strip('"\'` ')
+
+def parse_number(folded):
+    """Return the exact value of a folded decimal ("0,5", "-.5") or fraction ("1/2"), or None."""
+    if _DECIMAL.match(folded):
+        return Fraction(folded.replace(',', '.'))
+    match = _FRACTION.match(folded)
+    if match and int(match.group(2)):
+        return Fraction(int(match.group(1)), int(match.group(2)))
+    return None
+
+def rounding_tolerance(folded):
+    """Return how far a value may be from a stored answer and still round to it.
+
+    Half a unit in the last decimal place the answer gives, so "3.142" accepts
+    3.1416 but not 3.14. Integers and fractions are exact.
+    """
+    if not _DECIMAL.match(folded):
+        return 0
+    separator = max(folded.find('.'), folded.find(','))
+    places = len(folded) - separator - 1 if separator >= 0 else 0
+    return Fraction(1, 2 * 10 ** places) if places else 0
+
+def numbers_match(submitted, expected, tolerance=0):
+    return abs(submitted - expected) <= tolerance
+
+def _parse_options(options):
+    """Options are stored as a JSON list of strings; anything else means an open question."""
+    if not options:
+        return []
+    try:
+        options = json.loads(options)
+    except ValueError:
+        return []
+    return [str(option) for option in options] if isinstance(options, list) else []
+
+class Grader:
+    """Decides whether a submitted answer matches one question's expected answer.
+
+    Built once per question by compile_grader, so grading an answer only
+    normalizes the submission.
+    """
+    __slots__ = ('_text', '_number', '_tolerance', '_option_count', '_option_index', '_option_numbers', '_choice')
+
+    def __init__(self, answer, options):
+        self._text = fold_text(answer)
+        self._number = parse_number(self._text)
+        self._tolerance = rounding_tolerance(self._text)
+
+        self._option_count = len(options)
+        self._option_index = {}
+        for index, option in enumerate(fold_text(option) for option in options):
+            self._option_index.setdefault(option, index)
+        self._option_numbers = []
+        for index, option in enumerate(fold_text(option) for option in options):
+            number = parse_number(option)
+            if number is not None:
+                self._option_numbers.append((index, number, rounding_tolerance(option)))
+
+        # Closed questions compare option positions, so "b", the option's text and its value all match
+        self._choice = self._resolve_choice(self._text) if options else None
+
+    def _resolve_choice(self, folded):
+        """Return the index of the option a folded answer names, or None."""
+        if folded in self._option_index:
+            return self._option_index[folded]
+        match = _OPTION_LETTER.match(folded)
+        if match:
+            index = ord(match.group(1)) - ord('a')
+            if index < self._option_count:
+                return index
+        number = parse_number(folded)
+        if number is not None:
+            for index, option_number, tolerance in self._option_numbers:
+                if numbers_match(number, option_number, tolerance):
+                    return index
+        return None
+
+    def __call__(self, submitted):
+        folded = fold_text(submitted)
+        if self._choice is not None:
+            return self._resolve_choice(folded) == self._choice
+        if self._number is not None:
+            number = parse_number(folded)
+            if number is not None:
+                return numbers_match(number, self._number, self._tolerance)
+        return folded == self._text
+
+@lru_cache(maxsize=4096)
+def compile_grader(answer, options=None):
+    """Return the Grader for a question's stored answer and options JSON.
+
+    Cached by content, so an edited question gets a new grader.
+    """
+    return Grader(answer, _parse_options(options))
+
+def grade(question, submitted):
+    """Grade one answer; question needs answer and options."""
+    return compile_grader(question.answer, question.options)(submitted)
+
+def grade_many(pairs):
+    """Grade a list of (question, submitted answer) pairs; returns a list of booleans."""
+    graders = {}
+    results = []
+    for question, submitted in pairs:
+        key = (question.answer, question.options)
+        grader = graders.get(key)
+        if grader is None:
+            grader = graders[key] = compile_grader(*key)
+        results.append(grader(submitted))
+    return results
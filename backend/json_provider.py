@@ -0,0 +1,97 @@
+import json
+import re
+import secrets
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # Optional; the standard library encoder is used without it
+    orjson = None
+
+class RawJSON:
+    """A JSON document that is already encoded, written into responses as is.
+
+    Use it for values stored as JSON text, such as Question.options, so they
+    are sent as JSON values without being decoded and encoded again. The text
+    is trusted to be valid JSON.
+    """
+    __slots__ = ('text',)
+
+    def __init__(self, text):
+        self.text = text.decode() if isinstance(text, bytes) else text
+
+    def __repr__(self):
+        return f'RawJSON({self.text!r})'
+
+def raw_json(text):
+    """Wrap stored JSON text in RawJSON; empty or missing text becomes null."""
+    return RawJSON(text) if text else None
+
+class FastJSONProvider(DefaultJSONProvider):
+    """JSON provider that encodes with orjson when it is installed, and understands RawJSON.
+
+    Falls back to the standard library encoder, which the JSON_BACKEND=json
+    setting also forces. Values orjson cannot encode natively, such as dates,
+    go through Flask's usual conversions, so output matches the default
+    provider apart from key order: keys are not sorted unless sort_keys is set.
+    """
+    sort_keys = False
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.use_orjson = orjson is not None and app.config.get('JSON_BACKEND', 'orjson') == 'orjson'
+
+    def _encode(self, obj, indent=False):
+        """Return obj encoded as bytes (orjson) or str (standard library)."""
+        fragments = []
+        nonce = secrets.token_hex(8)
+
+        def default(value):
+            if isinstance(value, RawJSON):
+                if self.use_orjson and hasattr(orjson, 'Fragment'):  # orjson 3.9.1+
+                    return orjson.Fragment(value.text)
+                fragments.append(value.text)
+                # Unguessable stand-in, replaced by the fragment once encoding is done
+                return f'{nonce}:{len(fragments) - 1}'
+            return DefaultJSONProvider.default(value)
+
+        if self.use_orjson:
+            option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+            if indent:
+                option |= orjson.OPT_INDENT_2
+            if self.sort_keys:
+                option |= orjson.OPT_SORT_KEYS
+            encoded = orjson.dumps(obj, default=default, option=option)
+        else:
+            encoded = json.dumps(
+                obj, default=default, ensure_ascii=self.ensure_ascii, sort_keys=self.sort_keys,
+                indent=2 if indent else None, separators=None if indent else (',', ':')
+            )
+
+        if fragments:
+            encoded = self._splice(encoded, nonce, fragments)
+        return encoded
+
+    @staticmethod
+    def _splice(encoded, nonce, fragments):
+        pattern = f'"{nonce}:(\\d+)"'
+        if isinstance(encoded, bytes):
+            return re.sub(pattern.encode(), lambda m: fragments[int(m.group(1))].encode(), encoded)
+        return re.sub(pattern, lambda m: fragments[int(m.group(1))], encoded)
+
+    def dumps(self, obj, **kwargs):
+        encoded = self._encode(obj, indent=bool(kwargs.get('indent')))
+        return encoded.decode() if isinstance(encoded, bytes) else encoded
+
+    def loads(self, s, **kwargs):
+        if self.use_orjson and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        """Like jsonify, but hands orjson's bytes to the response without a round trip through str."""
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        encoded = self._encode(obj, indent=indent)
+        newline = b'\n' if isinstance(encoded, bytes) else '\n'
+        return self._app.response_class(encoded + newline, mimetype=self.mimetype)
@@ -1,14 +1,23 @@
 from flask import request, jsonify, Blueprint
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, get_jwt
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask_jwt_extended import create_access_token, jwt_required, get_jwt, current_user
 from datetime import datetime, timezone
+from collections import namedtuple
 
 # Create blueprint
 auth_bp = Blueprint('auth', __name__)
 
 # These will be imported from main.py when the blueprint is registered
-from main import db, jwt
+from main import app, db, jwt
 from models import User, TokenBlocklist
+from revocation import revocation_cache
+from cache import TTLCache
+from passwords import hash_password, verify_password, needs_rehash
+from roster import parse_roster, import_roster, RosterError
+
+# Detached snapshot of a user row, safe to share between requests
+CurrentUser = namedtuple('CurrentUser', ['id', 'username', 'email'])
+
+user_cache = TTLCache(maxsize=app.config['USER_CACHE_SIZE'], ttl=app.config['USER_CACHE_TTL_SECONDS'])
 
 @auth_bp.route('/register', methods=['POST'])
 def register():
@@ -20,14 +29,13 @@ def register():
     if not username or not password or not email:
         return jsonify({'message': 'Missing fields'}), 400
 
-    hashed_password = generate_password_hash(password)
-    
     if User.query.filter_by(username=username).first():
         return jsonify({'message': 'Username already exists'}), 409
     
     if User.query.filter_by(email=email).first():
         return jsonify({'message': 'Email already exists'}), 409
     
+    hashed_password = hash_password(password)
     new_user = User(username=username, password=hashed_password, email=email)
     
     db.session.add(new_user)
@@ -35,6 +43,34 @@ def register():
 
     return jsonify({'message': 'User registered successfully'}), 201
 
+@auth_bp.route('/register/bulk', methods=['POST'])
+@jwt_required()
+def register_bulk():
+    # Accept a CSV/JSON file upload, a raw text/csv body or a JSON list of users.
+    # utf-8-sig drops the byte order mark Excel writes at the start of CSV exports.
+    try:
+        if 'file' in request.files:
+            upload = request.files['file']
+            fmt = 'csv' if upload.filename.lower().endswith('.csv') else 'json'
+            rows = parse_roster(upload.read().decode('utf-8-sig'), fmt)
+        elif request.mimetype == 'text/csv':
+            rows = parse_roster(request.get_data().decode('utf-8-sig'), 'csv')
+        else:
+            rows = parse_roster(request.get_data().decode('utf-8-sig'), 'json')
+    except (RosterError, UnicodeDecodeError) as e:
+        return jsonify({'message': str(e)}), 400
+
+    # Hashing is slow by design, so a large roster would outlast the worker timeout
+    max_rows = app.config['ROSTER_MAX_ROWS_PER_REQUEST']
+    if len(rows) > max_rows:
+        return jsonify({
+            'message': f'At most {max_rows} users per request; import larger rosters with "flask import-roster"'
+        }), 413
+
+    result = import_roster(rows)
+    status = 201 if result['created'] else 200
+    return jsonify(result), status
+
 @auth_bp.route('/login', methods=['POST'])
 def login():
     data = request.get_json()
@@ -46,42 +82,75 @@ def login():
 
     user = User.query.filter_by(username=username).first()
 
-    if not user or not check_password_hash(user.password, password):
+    if not user or not verify_password(user.password, password):
         return jsonify({'message': 'Invalid credentials'}), 401
 
-    access_token = create_access_token(identity=user.username)
+    # Upgrade hashes made with an older method or cost while we have the plain password
+    if needs_rehash(user.password):
+        user.password = hash_password(password)
+        db.session.commit()
+
+    access_token = create_access_token(identity=user.username, additional_claims={'uid': user.id})
     
     return jsonify({'access_token': access_token}), 200
 
 @auth_bp.route('/profile', methods=['GET'])
 @jwt_required()
 def profile():
-    current_user = get_jwt_identity()
-    user = User.query.filter_by(username=current_user).first()
-
-    if not user:
-        return jsonify({'message': 'User not found'}), 404
-
     return jsonify({
-        'username': user.username,
-        'email': user.email
+        'username': current_user.username,
+        'email': current_user.email
     }), 200
 
 @auth_bp.route('/logout', methods=['POST'])
 @jwt_required()
 def logout():
-    jti = get_jwt()["jti"]
+    token = get_jwt()
+    jti = token["jti"]
     now = datetime.now(timezone.utc)
     
+    # Keep the row only as long as the token itself would have been valid
+    if "exp" in token:
+        expires_at = datetime.fromtimestamp(token["exp"], timezone.utc)
+    else:
+        expires_at = datetime.max
+    
     # Store the JTI in the blocklist to invalidate the token
-    db.session.add(TokenBlocklist(jti=jti, created_at=now))
+    db.session.add(TokenBlocklist(jti=jti, created_at=now, expires_at=expires_at))
     db.session.commit()
+    revocation_cache.add(jti, expires_at.replace(tzinfo=None))
     
     return jsonify(msg="Successfully logged out"), 200
 
 # Callback function to check if a JWT is in the blocklist
 @jwt.token_in_blocklist_loader
 def check_if_token_revoked(jwt_header, jwt_payload):
-    jti = jwt_payload["jti"]
-    token = TokenBlocklist.query.filter_by(jti=jti).first()
-    return token is not None
\ No newline at end of file
+    return revocation_cache.is_revoked(jwt_payload["jti"])
+
+# Resolve the user behind a JWT once per request, from the cache when possible
+@jwt.user_lookup_loader
+def load_current_user(jwt_header, jwt_payload):
+    username = jwt_payload["sub"]
+    user_id = jwt_payload.get("uid")
+
+    # Tokens issued before the uid claim existed only carry the username
+    key = user_id if user_id is not None else username
+    user = user_cache.get(key)
+    if user is None:
+        if user_id is not None:
+            row = db.session.get(User, user_id)
+        else:
+            row = User.query.filter_by(username=username).first()
+        if row is None:
+            return None
+        user = CurrentUser(row.id, row.username, row.email)
+        user_cache.set(key, user)
+
+    # Guard against a reused id now belonging to someone else
+    if user.username != username:
+        return None
+    return user
+
+@jwt.user_lookup_error_loader
+def user_not_found(jwt_header, jwt_payload):
+    return jsonify({'message': 'User not found'}), 404
@@ -5,10 +5,14 @@ from flask_cors import CORS
 from datetime import timedelta
 import os
 import pathlib
+import database
+from json_provider import FastJSONProvider
+from compression import install_compression
 
 # Initialize Flask app
 app = Flask(__name__)
-CORS(app)
+# Expose Link so browser clients can follow pagination, and ETag for conditional requests
+CORS(app, expose_headers=['Link', 'ETag'])
 
 # Configure app
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your_secret_key')
@@ -16,17 +20,43 @@ app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your_secret_key')
 # Make sure the instance directory exists
 os.makedirs(app.instance_path, exist_ok=True)
 
-# Configure database with absolute path
-db_path = os.path.join(app.instance_path, 'users.db')
-app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+# Configure database; defaults to an SQLite file in the instance folder
+app.config['SQLALCHEMY_DATABASE_URI'] = database.database_url(os.environ)
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = database.engine_options(app.config['SQLALCHEMY_DATABASE_URI'], os.environ)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLITE_PRAGMAS'] = database.sqlite_pragmas(os.environ)
 app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'jwt_secret_key')
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(days=30)
+app.config['REVOCATION_CACHE_REFRESH_SECONDS'] = float(os.environ.get('REVOCATION_CACHE_REFRESH_SECONDS', 1.0))
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+app.config['PASSWORD_HASH_TIMEOUT_SECONDS'] = float(os.environ.get('PASSWORD_HASH_TIMEOUT_SECONDS', 30))
+# Rows /register/bulk accepts; each costs a password hash, so larger rosters go through flask import-roster
+app.config['ROSTER_MAX_ROWS_PER_REQUEST'] = int(os.environ.get('ROSTER_MAX_ROWS_PER_REQUEST', 200))
+app.config['USER_CACHE_SIZE'] = int(os.environ.get('USER_CACHE_SIZE', 1024))
+app.config['USER_CACHE_TTL_SECONDS'] = float(os.environ.get('USER_CACHE_TTL_SECONDS', 60))
+app.config['BLOCKLIST_PURGE_INTERVAL_SECONDS'] = int(os.environ.get('BLOCKLIST_PURGE_INTERVAL_SECONDS', 0))
+app.config['BLOCKLIST_PURGE_BATCH_SIZE'] = int(os.environ.get('BLOCKLIST_PURGE_BATCH_SIZE', 1000))
+app.config['TEMPLATE_DELETE_BATCH_SIZE'] = int(os.environ.get('TEMPLATE_DELETE_BATCH_SIZE', 1000))
+app.config['EXPORT_BATCH_SIZE'] = int(os.environ.get('EXPORT_BATCH_SIZE', 1000))
+app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+app.config['COMPRESS_CACHE_SIZE'] = int(os.environ.get('COMPRESS_CACHE_SIZE', 256))
+app.config['COMPRESS_CACHE_TTL_SECONDS'] = float(os.environ.get('COMPRESS_CACHE_TTL_SECONDS', 300))
+app.config['JSON_BACKEND'] = os.environ.get('JSON_BACKEND', 'orjson')  # "json" forces the standard library encoder
+
+# Encode responses with orjson when installed, and let routes splice stored JSON in with RawJSON
+app.json = FastJSONProvider(app)
+
+# gzip (and brotli, when installed) for large responses, cached by ETag
+install_compression(app)
 
 # Initialize extensions
 db = SQLAlchemy(app)
 jwt = JWTManager(app)
 
+with app.app_context():
+    database.install_sqlite_pragmas(db.engine, app.config['SQLITE_PRAGMAS'])
+
 def init_db():
     """Initialize the database."""
     # Ensure the application instance folder exists
@@ -34,9 +64,11 @@ def init_db():
     
     # Import models to ensure they're registered with SQLAlchemy
     import models
+    import migrations
     
     with app.app_context():
         db.create_all()
+        migrations.upgrade(db.engine, app.config)
         print(f"Database tables created successfully at {app.config['SQLALCHEMY_DATABASE_URI']}")
 
 # Import blueprints after initializing extensions to avoid circular imports
@@ -58,15 +90,47 @@ template_module = importlib.util.module_from_spec(spec)
 sys.modules["template_module"] = template_module
 spec.loader.exec_module(template_module)
 
+# Import stats blueprint
+stats_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stats.py')
+spec = importlib.util.spec_from_file_location("stats_module", stats_path)
+stats_module = importlib.util.module_from_spec(spec)
+sys.modules["stats_module"] = stats_module
+spec.loader.exec_module(stats_module)
+
+# Import export blueprint
+export_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'export.py')
+spec = importlib.util.spec_from_file_location("export_module", export_path)
+export_module = importlib.util.module_from_spec(spec)
+sys.modules["export_module"] = export_module
+spec.loader.exec_module(export_module)
+
 # Get blueprints from modules
 auth_bp = login_module.auth_bp
 template_bp = template_module.template_bp
+stats_bp = stats_module.stats_bp
+export_bp = export_module.export_bp
 
 # Register blueprints
 app.register_blueprint(auth_bp)
 app.register_blueprint(template_bp)
+app.register_blueprint(stats_bp)
+app.register_blueprint(export_bp)
+
+# Register CLI commands
+from revocation import purge_blocklist_command, start_purge_thread
+from roster import import_roster_command
+from query_plans import explain_queries_command
+from deletion import resume_template_deletes, resume_template_deletes_command
+app.cli.add_command(purge_blocklist_command)
+app.cli.add_command(import_roster_command)
+app.cli.add_command(explain_queries_command)
+app.cli.add_command(export_module.export_data_command)
+app.cli.add_command(resume_template_deletes_command)
 
 init_db()
+start_purge_thread(app)
+# Background deletes live in memory, so finish any a previous process did not
+resume_template_deletes(app)
 
 @app.route("/")
 def hello_world():
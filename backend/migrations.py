@@ -0,0 +1,218 @@
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import DateTime, bindparam, inspect, text
+
+def upgrade(engine, config):
+    """Bring an existing database up to date with the models.
+
+    db.create_all() only creates missing tables, so columns and indexes added
+    to a table after it was first created are applied here. Every step checks
+    the current schema first, which makes it safe to run on each start-up.
+    """
+    with engine.begin() as conn:
+        for step in STEPS:
+            step(conn, config)
+
+def _columns(conn, table):
+    return {column['name'] for column in inspect(conn).get_columns(table)}
+
+def _add_column(conn, table, column, ddl):
+    """Add a column if the table does not have it yet. Returns True if it was added."""
+    if column in _columns(conn, table):
+        return False
+    quoted = conn.dialect.identifier_preparer.quote(table)  # "user" is reserved on PostgreSQL
+    conn.execute(text(f'ALTER TABLE {quoted} ADD COLUMN {column} {ddl}'))
+    return True
+
+def _has_index(conn, table, name):
+    return any(index['name'] == name for index in inspect(conn).get_indexes(table))
+
+def _create_index(conn, name, table, columns, unique=False):
+    unique_sql = 'UNIQUE ' if unique else ''
+    conn.execute(text(f'CREATE {unique_sql}INDEX IF NOT EXISTS {name} ON {table} ({columns})'))
+
+def token_blocklist_expiry(conn, config):
+    """Store when each revoked token expires so expired rows can be purged."""
+    if _add_column(conn, 'token_blocklist', 'expires_at', 'DATETIME'):
+        lifetime = config.get('JWT_ACCESS_TOKEN_EXPIRES') or timedelta(days=30)
+        rows = conn.execute(text('SELECT id, created_at FROM token_blocklist')).all()
+        if rows:
+            conn.execute(
+                text('UPDATE token_blocklist SET expires_at = :expires_at WHERE id = :id')
+                .bindparams(bindparam('expires_at', type_=DateTime())),
+                [{'id': row_id, 'expires_at': _parse_datetime(created_at) + lifetime} for row_id, created_at in rows]
+            )
+    _create_index(conn, 'ix_token_blocklist_expires_at', 'token_blocklist', 'expires_at')
+
+def _parse_datetime(value):
+    if value is None:
+        return datetime.now()
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value))
+
+def exam_template_id(conn, config):
+    """Link exams to their template; older databases only had the subject column."""
+    _add_column(conn, 'exam', 'template_id', 'INTEGER REFERENCES template (id)')
+
+def lookup_indexes(conn, config):
+    """Index the columns every blueprint query filters on."""
+    # Stats are indexed by (template_id, topic_id) once topics are interned, see topic_ids
+    _create_index(conn, 'ix_template_user_id', 'template', 'user_id, id')
+    _create_index(conn, 'ix_exam_template_id', 'exam', 'template_id, id')
+    _create_index(conn, 'ix_question_exam_id', 'question', 'exam_id, id')
+
+def exam_questions_relationship(conn, config):
+    """Drop the comma-separated exam.questions column; questions point at their exam instead."""
+    if 'questions' not in _columns(conn, 'exam'):
+        return
+
+    if conn.dialect.name != 'sqlite':
+        conn.execute(text('ALTER TABLE exam DROP COLUMN questions'))
+        conn.execute(text('ALTER TABLE exam ALTER COLUMN subject DROP NOT NULL'))
+        return
+
+    # SQLite cannot relax NOT NULL on subject in place, so rebuild the table
+    conn.execute(text(
+        'CREATE TABLE exam_new ('
+        'id INTEGER NOT NULL PRIMARY KEY, '
+        'subject TEXT, '
+        'template_id INTEGER REFERENCES template (id))'
+    ))
+    conn.execute(text('INSERT INTO exam_new (id, subject, template_id) SELECT id, subject, template_id FROM exam'))
+    conn.execute(text('DROP TABLE exam'))
+    conn.execute(text('ALTER TABLE exam_new RENAME TO exam'))
+    _create_index(conn, 'ix_exam_template_id', 'exam', 'template_id, id')
+
+def topic_ids(conn, config):
+    """Intern topic names into the topic table and link stats, questions and templates to them."""
+    added_stat = _add_column(conn, 'stat', 'topic_id', 'INTEGER REFERENCES topic (id)')
+    added_question = _add_column(conn, 'question', 'topic_id', 'INTEGER REFERENCES topic (id)')
+
+    if added_stat or added_question:
+        names = set()
+        names.update(name for (name,) in conn.execute(text('SELECT DISTINCT topic FROM stat')))
+        names.update(name for (name,) in conn.execute(text('SELECT DISTINCT topic FROM question')))
+        templates = conn.execute(text('SELECT id, topics FROM template')).all()
+        for _, topics in templates:
+            names.update(name.strip() for name in (topics or '').split(',') if name.strip())
+
+        existing = {name for (name,) in conn.execute(text('SELECT name FROM topic'))}
+        new_names = [{'name': name} for name in names - existing if name]
+        if new_names:
+            conn.execute(text('INSERT INTO topic (name) VALUES (:name)'), new_names)
+
+        for table in ('stat', 'question'):
+            conn.execute(text(
+                f'UPDATE {table} SET topic_id = (SELECT id FROM topic WHERE topic.name = {table}.topic) '
+                'WHERE topic_id IS NULL'
+            ))
+
+        topic_id_by_name = dict(conn.execute(text('SELECT name, id FROM topic')).all())
+        links = {
+            (template_id, topic_id_by_name[name.strip()])
+            for template_id, topics in templates
+            for name in (topics or '').split(',') if name.strip()
+        }
+        conn.execute(text('DELETE FROM template_topic'))
+        if links:
+            conn.execute(
+                text('INSERT INTO template_topic (template_id, topic_id) VALUES (:template_id, :topic_id)'),
+                [{'template_id': template_id, 'topic_id': topic_id} for template_id, topic_id in links]
+            )
+
+    if not _has_index(conn, 'stat', 'ix_stat_template_id_topic_id'):
+        conn.execute(text('DROP INDEX IF EXISTS ix_stat_template_id_topic'))
+        # Keep the newest stat per (template, topic) before making the pair unique
+        conn.execute(text(
+            'DELETE FROM stat WHERE id NOT IN (SELECT MAX(id) FROM stat GROUP BY template_id, topic_id)'
+        ))
+    _create_index(conn, 'ix_stat_template_id_topic_id', 'stat', 'template_id, topic_id', unique=True)
+
+def pagination_indexes(conn, config):
+    """Let stat pages be read in id order without sorting."""
+    _create_index(conn, 'ix_stat_template_id', 'stat', 'template_id, id')
+
+def row_versions(conn, config):
+    """Version counters that ETags are derived from."""
+    _add_column(conn, 'template', 'version', 'INTEGER NOT NULL DEFAULT 1')
+    _add_column(conn, 'user', 'data_version', 'INTEGER NOT NULL DEFAULT 1')
+
+def daily_rollups(conn, config):
+    """Fill daily_topic_stat from the answers logged before it was maintained."""
+    if conn.execute(text('SELECT 1 FROM daily_topic_stat LIMIT 1')).first():
+        return
+    day = 'date(e.created_at)' if conn.dialect.name == 'sqlite' else 'CAST(e.created_at AS DATE)'
+    # Older tables get opening_difficulty from rollup_opening_difficulty; the history is not known either way
+    opening_column, opening_value = '', ''
+    if 'opening_difficulty' in _columns(conn, 'daily_topic_stat'):
+        opening_column, opening_value = ', opening_difficulty', ', COALESCE(MAX(s.difficulty), 5.0)'
+    conn.execute(text(f'''
+        INSERT INTO daily_topic_stat (user_id, day, template_id, topic_id, attempts, correct, difficulty{opening_column})
+        SELECT e.user_id, {day}, e.template_id, e.topic_id, COUNT(*),
+               SUM(CASE WHEN e.is_correct THEN 1 ELSE 0 END), COALESCE(MAX(s.difficulty), 5.0){opening_value}
+        FROM answer_event e
+        LEFT JOIN stat s ON s.template_id = e.template_id AND s.topic_id = e.topic_id
+        GROUP BY e.user_id, {day}, e.template_id, e.topic_id
+    '''))
+
+def stat_user_id(conn, config):
+    """Copy each template's owner onto its stats, so a user's stats can be ranked by difficulty."""
+    if _add_column(conn, 'stat', 'user_id', 'INTEGER REFERENCES "user" (id)'):
+        conn.execute(text(
+            'UPDATE stat SET user_id = (SELECT user_id FROM template WHERE template.id = stat.template_id) '
+            'WHERE user_id IS NULL'
+        ))
+    _create_index(conn, 'ix_stat_user_id_difficulty', 'stat', 'user_id, difficulty')
+
+def template_delete_indexes(conn, config):
+    """Let a template's rollups be deleted without scanning the table."""
+    _create_index(conn, 'ix_daily_topic_stat_template_id', 'daily_topic_stat', 'template_id')
+
+def token_blocklist_created_at_index(conn, config):
+    """Let revocation caches read recent blocklist rows without scanning the table."""
+    _create_index(conn, 'ix_token_blocklist_created_at', 'token_blocklist', 'created_at')
+
+def rollup_opening_difficulty(conn, config):
+    """Keep each rollup's difficulty before the day's first answer, so one day has a trend too."""
+    if _add_column(conn, 'daily_topic_stat', 'opening_difficulty', 'FLOAT'):
+        # Not recorded for older days; their trend reads as stable
+        conn.execute(text('UPDATE daily_topic_stat SET opening_difficulty = difficulty WHERE opening_difficulty IS NULL'))
+
+def template_stamps(conn, config):
+    """Give every template the random stamp its ETags include."""
+    _add_column(conn, 'template', 'stamp', 'VARCHAR(32)')
+    ids = [row_id for (row_id,) in conn.execute(text('SELECT id FROM template WHERE stamp IS NULL'))]
+    if ids:
+        conn.execute(text('UPDATE template SET stamp = :stamp WHERE id = :id'),
+                     [{'id': row_id, 'stamp': uuid.uuid4().hex} for row_id in ids])
+
+def exam_versions(conn, config):
+    """A counter for exam ETags, so answers no longer change them."""
+    _add_column(conn, 'exam', 'version', 'INTEGER NOT NULL DEFAULT 1')
+
+def template_deleting_flag(conn, config):
+    """Mark templates a background delete has started on, so a restart can finish them."""
+    _add_column(conn, 'template', 'deleting', 'BOOLEAN NOT NULL DEFAULT FALSE')
+    # Partial, matching how the dialect renders filter(Template.deleting), like the model's index
+    condition = 'deleting = 1' if conn.dialect.name == 'sqlite' else 'deleting'
+    conn.execute(text(f'CREATE INDEX IF NOT EXISTS ix_template_deleting ON template (deleting) WHERE {condition}'))
+
+# Applied in order; append new steps at the end
+STEPS = [
+    token_blocklist_expiry,
+    exam_template_id,
+    lookup_indexes,
+    exam_questions_relationship,
+    topic_ids,
+    pagination_indexes,
+    row_versions,
+    daily_rollups,
+    stat_user_id,
+    template_delete_indexes,
+    token_blocklist_created_at_index,
+    rollup_opening_difficulty,
+    template_stamps,
+    exam_versions,
+    template_deleting_flag,
+]
@@ -1,43 +1,136 @@
+import uuid
 from main import db
+from sqlalchemy import func, select
+
+# Topics listed by each template, in no particular order
+template_topic = db.Table(
+    'template_topic',
+    db.Column('template_id', db.Integer, db.ForeignKey('template.id'), primary_key=True),
+    db.Column('topic_id', db.Integer, db.ForeignKey('topic.id'), primary_key=True),
+    db.Index('ix_template_topic_topic_id', 'topic_id', 'template_id')
+)
+
+class Topic(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.Text, unique=True, nullable=False)
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
-    password = db.Column(db.String(120), nullable=False)
+    password = db.Column(db.String(255), nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
+    # Bumped whenever a template or exam of this user is added, changed or removed; the list routes' ETags derive from it
+    data_version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
     templates = db.relationship('Template', backref='creator', lazy=True)
 
 class Stat(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     topic = db.Column(db.String(100), nullable=False)
+    topic_id = db.Column(db.Integer, db.ForeignKey('topic.id'), nullable=False)  # Filled in from topic on flush
     difficulty = db.Column(db.Float, nullable=False)  # Could be a score from 0-10
     trend = db.Column(db.String(10), nullable=False)  # "up" or "down"
     template_id = db.Column(db.Integer, db.ForeignKey('template.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)  # The template's owner, filled in on flush
+
+    __table_args__ = (
+        db.Index('ix_stat_template_id_topic_id', 'template_id', 'topic_id', unique=True),
+        db.Index('ix_stat_template_id', 'template_id', 'id'),
+        # A user's weakest topics are the last entries under their user_id
+        db.Index('ix_stat_user_id_difficulty', 'user_id', 'difficulty'),
+    )
 
 class Template(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     subject = db.Column(db.String(80))
-    topics = db.Column(db.String(200), nullable=False)  # Could be JSON or comma-separated
+    topics = db.Column(db.Text, nullable=False)  # Comma-separated, mirrored into template_topic on flush
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    # Bumped whenever the template or its exams change; ETags of its read routes derive from it
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    # Random per row, so a template that reuses a deleted one's id never reuses its ETags
+    stamp = db.Column(db.String(32), default=lambda: uuid.uuid4().hex)
+    # Set while a background delete purges the template; such templates are hidden everywhere
+    deleting = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
     stats = db.relationship('Stat', backref='template', lazy=True)
     exams = db.relationship('Exam', backref='template', lazy=True)
+    topic_list = db.relationship('Topic', secondary=template_topic, lazy=True, viewonly=True)
+
+    __table_args__ = (
+        db.Index('ix_template_user_id', 'user_id', 'id'),
+        # Partial, so only the few templates being deleted are in it. The conditions
+        # match how each dialect renders filter(Template.deleting).
+        db.Index('ix_template_deleting', 'deleting', sqlite_where=db.text('deleting = 1'), postgresql_where=db.text('deleting')),
+    )
 
 class Exam(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    subject = db.Column(db.Text, db.ForeignKey('template.id'), nullable=False)
-    questions = db.Column(db.Text, nullable=False)  # JSON string for questions
+    subject = db.Column(db.Text)  # Subject name given by the generator
+    template_id = db.Column(db.Integer, db.ForeignKey('template.id'), nullable=False)
+    # Bumped when the exam's questions change; its ETag is derived from it
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    questions = db.relationship('Question', backref='exam', lazy=True, order_by='Question.id')
+
+    __table_args__ = (
+        db.Index('ix_exam_template_id', 'template_id', 'id'),
+    )
 
 class Question(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     type = db.Column(db.String(10), nullable=False)  # "open" or "closed"
     answer = db.Column(db.Text, nullable=False)
-    points = db.Column(db.Integer, nullable=False)
+    points = db.Column(db.Integer)
     topic = db.Column(db.String(100), nullable=False)
-    options = db.Column(db.Text, nullable=False)  # JSON string for closed questions
-    solution = db.Column(db.Text, nullable=False)  # JSON string for closed questions
+    topic_id = db.Column(db.Integer, db.ForeignKey('topic.id'))  # Filled in from topic on flush
+    options = db.Column(db.Text)  # JSON string for closed questions, empty for open ones
+    solution = db.deferred(db.Column(db.Text))  # JSON string; deferred because no read route returns it
     exam_id = db.Column(db.Integer, db.ForeignKey('exam.id'), nullable=False)
-    
+
+    __table_args__ = (
+        db.Index('ix_question_exam_id', 'exam_id', 'id'),
+    )
+
+class AnswerEvent(db.Model):
+    """One answer or clarification request. Rows are only ever inserted; stats are folded from them."""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    template_id = db.Column(db.Integer, db.ForeignKey('template.id'), nullable=False)
+    exam_id = db.Column(db.Integer, db.ForeignKey('exam.id'))
+    question_id = db.Column(db.Integer, db.ForeignKey('question.id'))
+    topic_id = db.Column(db.Integer, db.ForeignKey('topic.id'), nullable=False)
+    kind = db.Column(db.String(20), nullable=False)  # "answer" or "clarification"
+    is_correct = db.Column(db.Boolean, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=db.func.current_timestamp())
+
+    __table_args__ = (
+        db.Index('ix_answer_event_user_id_created_at', 'user_id', 'created_at'),
+        db.Index('ix_answer_event_template_id', 'template_id', 'id'),
+    )
+
+class DailyTopicStat(db.Model):
+    """Answers per user, template, topic and UTC day, kept up to date as answers arrive."""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    template_id = db.Column(db.Integer, db.ForeignKey('template.id'), nullable=False)
+    topic_id = db.Column(db.Integer, db.ForeignKey('topic.id'), nullable=False)
+    attempts = db.Column(db.Integer, nullable=False)
+    correct = db.Column(db.Integer, nullable=False)
+    difficulty = db.Column(db.Float, nullable=False)  # The stat's difficulty after the day's last answer
+    opening_difficulty = db.Column(db.Float, nullable=False)  # The stat's difficulty before the day's first answer
+
+    __table_args__ = (
+        # Also serves the dashboard's range scan on (user_id, day)
+        db.Index('ix_daily_topic_stat_user_id_day', 'user_id', 'day', 'template_id', 'topic_id', unique=True),
+        db.Index('ix_daily_topic_stat_template_id', 'template_id'),
+    )
+
+# Counted in SQL; deferred so only listings that ask for it with undefer() pay for the subquery
+Exam.question_count = db.column_property(
+    select(func.count(Question.id)).where(Question.exam_id == Exam.id).correlate_except(Question).scalar_subquery(),
+    deferred=True
+)
+
 class TokenBlocklist(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     jti = db.Column(db.String(36), unique=True, nullable=False)
-    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
\ No newline at end of file
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp(), index=True)  # Revocation caches sync from it
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)  # When the revoked token would have expired anyway
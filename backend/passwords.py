@@ -0,0 +1,83 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+# Hash prefix ("scrypt:32768:8:1") produced by each configured method
+_method_prefixes = {}
+
+def _get_pool():
+    """Return the hashing pool, or None to hash inline.
+
+    The pool is created on first use so every gunicorn worker gets its own
+    after forking rather than sharing the parent's.
+    """
+    global _pool, _pool_pid
+    workers = current_app.config.get('PASSWORD_HASH_WORKERS', 0)
+    if not workers:
+        return None
+
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ProcessPoolExecutor(max_workers=workers)
+            _pool_pid = os.getpid()
+        return _pool
+
+def _discard_pool(pool):
+    """Drop a broken pool so the next _get_pool() starts a fresh one."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+    current_app.logger.warning('Password hashing pool broke (a worker process died); starting a new one')
+
+def _with_pool(call):
+    """Run call(pool), retrying once on a new pool if a worker process died, e.g. killed for memory."""
+    pool = _get_pool()
+    try:
+        return call(pool)
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        return call(_get_pool())
+
+def _run(fn, *args):
+    if _get_pool() is None:
+        return fn(*args)
+    timeout = current_app.config.get('PASSWORD_HASH_TIMEOUT_SECONDS')
+    return _with_pool(lambda pool: pool.submit(fn, *args).result(timeout=timeout))
+
+def hash_password(password):
+    """Hash a password with the configured method."""
+    return _run(generate_password_hash, password, current_app.config['PASSWORD_HASH_METHOD'])
+
+def verify_password(password_hash, password):
+    """Check a password against a stored hash."""
+    return _run(check_password_hash, password_hash, password)
+
+def needs_rehash(password_hash):
+    """Return True if the hash was made with a different method or cost than configured."""
+    method = current_app.config['PASSWORD_HASH_METHOD']
+    if method not in _method_prefixes:
+        # Werkzeug fills in default parameters, so hash once to learn the full prefix
+        _method_prefixes[method] = _run(generate_password_hash, '', method).split('$', 1)[0]
+    return password_hash.split('$', 1)[0] != _method_prefixes[method]
+
+def hash_passwords(passwords):
+    """Hash many passwords at once, spread across the pool.
+
+    No timeout applies here: a whole roster can legitimately take longer than
+    a single hash is allowed to.
+    """
+    method = current_app.config['PASSWORD_HASH_METHOD']
+    if _get_pool() is None:
+        return [generate_password_hash(password, method) for password in passwords]
+    return _with_pool(lambda pool: list(pool.map(
+        generate_password_hash, passwords, [method] * len(passwords), chunksize=16
+    )))
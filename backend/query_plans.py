@@ -0,0 +1,98 @@
+import sys
+from datetime import date, datetime
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import text, and_, or_, func
+from sqlalchemy.orm import undefer
+
+from main import db
+from models import User, Template, Exam, Question, Stat, Topic, TokenBlocklist, AnswerEvent, DailyTopicStat, template_topic
+
+# The lookups the blueprints issue, with representative parameters. Add new
+# hot queries here so the plan check covers them.
+BLUEPRINT_QUERIES = [
+    ('user by username', lambda: User.query.filter_by(username='user')),
+    ('user by email', lambda: User.query.filter_by(email='user@example.com')),
+    ('templates of user', lambda: Template.query.filter(Template.user_id == 1, Template.deleting.is_(False), Template.id > 0)
+        .order_by(Template.id).limit(51)),
+    ('template of user', lambda: Template.query.filter_by(id=1, user_id=1, deleting=False)),
+    ('templates being deleted', lambda: db.session.query(Template.id).filter(Template.deleting)),
+    ('exams of template', lambda: Exam.query.options(undefer(Exam.question_count))
+        .filter(Exam.template_id == 1, Exam.id > 0)
+        .order_by(Exam.id).limit(51)),
+    ('exams of user', lambda: db.session.query(Exam.id, Exam.template_id, Template.topics, Exam.question_count)
+        .join(Template, Exam.template_id == Template.id)
+        .filter(Template.user_id == 1, Template.deleting.is_(False), Template.id >= 1, or_(Template.id > 1, Exam.id > 1))
+        .order_by(Template.id, Exam.id).limit(51)),
+    ('exam by id', lambda: Exam.query.filter_by(id=1)),
+    ('exam with owner and question', lambda: db.session.query(Exam, Template.user_id, Question)
+        .join(Template, Exam.template_id == Template.id)
+        .outerjoin(Question, and_(Question.id == 1, Question.exam_id == Exam.id))
+        .filter(Exam.id == 1, Template.deleting.is_(False))),
+    ('questions of user', lambda: db.session.query(Question.id, Question.options)
+        .join(Exam, Question.exam_id == Exam.id)
+        .join(Template, Exam.template_id == Template.id)
+        .filter(Template.user_id == 1)
+        .order_by(Template.id, Exam.id, Question.id)),
+    ('stats of user', lambda: db.session.query(Stat.id, Stat.topic)
+        .join(Template, Stat.template_id == Template.id)
+        .filter(Template.user_id == 1)
+        .order_by(Template.id, Stat.id)),
+    ('questions of exam', lambda: Question.query.filter_by(exam_id=1).order_by(Question.id)),
+    ('stats of template', lambda: Stat.query.filter(Stat.template_id == 1, Stat.id > 0)
+        .order_by(Stat.id).limit(51)),
+    ('weakest stats of user', lambda: Stat.query.join(Template, Stat.template_id == Template.id)
+        .filter(Stat.user_id == 1, Template.deleting.is_(False))
+        .order_by(Stat.difficulty.desc(), Stat.id.desc()).limit(5)),
+    ('stat for topic', lambda: Stat.query.filter_by(template_id=1, topic_id=1)),
+    ('rollups of user', lambda: db.session.query(DailyTopicStat.day, Template.topics, Topic.name)
+        .join(Template, DailyTopicStat.template_id == Template.id)
+        .join(Topic, DailyTopicStat.topic_id == Topic.id)
+        .filter(DailyTopicStat.user_id == 1, DailyTopicStat.day >= date(2000, 1, 1), Template.deleting.is_(False))
+        .order_by(DailyTopicStat.day)),
+    ('answers of template', lambda: AnswerEvent.query.filter_by(template_id=1)),
+    ('last answer of template', lambda: db.session.query(func.max(AnswerEvent.id))
+        .filter(AnswerEvent.template_id == 1)),
+    ('rollups of template', lambda: DailyTopicStat.query.filter_by(template_id=1)),
+    ('questions of template', lambda: db.session.query(Question.id)
+        .join(Exam, Question.exam_id == Exam.id)
+        .filter(Exam.template_id == 1)),
+    ('topics by name', lambda: Topic.query.filter(Topic.name.in_(['a', 'b']))),
+    ('templates with topic', lambda: db.session.query(template_topic).filter_by(topic_id=1)),
+    ('topics of template', lambda: db.session.query(template_topic).filter_by(template_id=1)),
+    ('revoked since', lambda: TokenBlocklist.query.filter(TokenBlocklist.created_at >= datetime(2000, 1, 1))),
+    ('expired tokens', lambda: TokenBlocklist.query
+        .filter(TokenBlocklist.expires_at < datetime(2000, 1, 1))
+        .order_by(TokenBlocklist.expires_at)),
+]
+
+def explain_queries():
+    """Return (name, plan lines) for every blueprint query. SQLite only."""
+    plans = []
+    for name, build in BLUEPRINT_QUERIES:
+        statement = build().statement.compile(db.engine, compile_kwargs={'literal_binds': True})
+        rows = db.session.execute(text(f'EXPLAIN QUERY PLAN {statement}')).all()
+        plans.append((name, [row[-1] for row in rows]))
+    return plans
+
+def full_scans(plans):
+    """Return the names of queries whose plan scans a whole table or index."""
+    return [name for name, lines in plans if any(line.startswith('SCAN') for line in lines)]
+
+@click.command('explain-queries')
+@with_appcontext
+def explain_queries_command():
+    """Print EXPLAIN QUERY PLAN for each blueprint query and fail on full scans."""
+    if db.engine.dialect.name != 'sqlite':
+        raise click.ClickException('EXPLAIN QUERY PLAN is only available on SQLite')
+
+    plans = explain_queries()
+    for name, lines in plans:
+        click.echo(name)
+        for line in lines:
+            click.echo(f'    {line}')
+
+    scans = full_scans(plans)
+    if scans:
+        click.echo(f"Full scans in: {', '.join(scans)}", err=True)
+        sys.exit(1)
@@ -0,0 +1,162 @@
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from main import db
+from models import TokenBlocklist
+
+# How often the in-memory set drops jtis whose tokens have expired anyway
+PRUNE_INTERVAL_SECONDS = 600
+
+# Each sync re-reads rows created this long before the newest one seen: on
+# databases with concurrent writers a row can commit after a newer one. Rows
+# whose transaction took longer still arrive with the periodic full reload.
+SYNC_MARGIN = timedelta(seconds=120)
+FULL_RELOAD_INTERVAL_SECONDS = 600
+
+class RevocationCache:
+    """In-process hash-set front for the TokenBlocklist table.
+
+    The first lookup loads every revoked jti. After that the table is only
+    queried for recent rows (see SYNC_MARGIN), and at most once every
+    REVOCATION_CACHE_REFRESH_SECONDS, so logouts handled by other workers are
+    still picked up while most lookups never touch the database. Everything
+    is reloaded every FULL_RELOAD_INTERVAL_SECONDS.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget everything and reload from the database on the next lookup."""
+        with self._lock:
+            self._revoked = {}
+            self._newest_created_at = None
+            self._synced_at = None
+            self._reloaded_at = None
+            self._pruned_at = time.monotonic()
+            self.hits = 0
+            self.misses = 0
+
+    def add(self, jti, expires_at):
+        """Record a jti revoked by this process without waiting for a refresh."""
+        with self._lock:
+            self._revoked[jti] = expires_at
+
+    def is_revoked(self, jti):
+        """Return True if the token with this jti has been revoked."""
+        # Revocation is permanent, so a jti already in the set never needs the database
+        if jti in self._revoked:
+            self.hits += 1
+            return True
+
+        refresh_interval = current_app.config.get('REVOCATION_CACHE_REFRESH_SECONDS', 1.0)
+        if self._synced_at is not None and time.monotonic() - self._synced_at < refresh_interval:
+            self.hits += 1
+            return False
+
+        self.misses += 1
+        self._sync()
+        return jti in self._revoked
+
+    def _sync(self):
+        """Pull blocklist rows added since the last sync, or all of them when a full reload is due."""
+        with self._lock:
+            now = time.monotonic()
+            query = TokenBlocklist.query \
+                .with_entities(TokenBlocklist.jti, TokenBlocklist.created_at, TokenBlocklist.expires_at)
+            full_reload = self._reloaded_at is None or now - self._reloaded_at >= FULL_RELOAD_INTERVAL_SECONDS
+            if not full_reload and self._newest_created_at is not None:
+                query = query.filter(TokenBlocklist.created_at >= self._newest_created_at - SYNC_MARGIN)
+            for jti, created_at, expires_at in query:
+                self._revoked[jti] = expires_at
+                if created_at is not None and (self._newest_created_at is None or created_at > self._newest_created_at):
+                    self._newest_created_at = created_at
+            self._synced_at = now
+            if full_reload:
+                self._reloaded_at = now
+
+            if self._synced_at - self._pruned_at >= PRUNE_INTERVAL_SECONDS:
+                self._prune()
+
+        current_app.logger.debug('Revocation cache: %(hits)d hits, %(misses)d misses, %(size)d jtis', self.stats())
+
+    def _prune(self):
+        """Drop jtis of expired tokens; JWT validation rejects those before the blocklist is consulted."""
+        now = _utcnow()
+        self._revoked = {
+            jti: expires_at for jti, expires_at in self._revoked.items()
+            if expires_at is None or expires_at > now
+        }
+        self._pruned_at = time.monotonic()
+
+    def stats(self):
+        """Return hit/miss counters for monitoring."""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0,
+            'size': len(self._revoked)
+        }
+
+revocation_cache = RevocationCache()
+
+def _utcnow():
+    # SQLite hands DateTime values back without tzinfo, so compare naive UTC
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def purge_expired_tokens(batch_size=1000):
+    """Delete blocklist rows whose tokens have expired, in batches. Returns the number deleted."""
+    now = _utcnow()
+    deleted = 0
+
+    while True:
+        ids = [row_id for (row_id,) in TokenBlocklist.query
+               .with_entities(TokenBlocklist.id)
+               .filter(TokenBlocklist.expires_at < now)
+               .order_by(TokenBlocklist.expires_at)
+               .limit(batch_size)]
+        if not ids:
+            break
+
+        TokenBlocklist.query.filter(TokenBlocklist.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        deleted += len(ids)
+
+    return deleted
+
+def start_purge_thread(app):
+    """Purge expired tokens every BLOCKLIST_PURGE_INTERVAL_SECONDS in a background thread."""
+    interval = app.config.get('BLOCKLIST_PURGE_INTERVAL_SECONDS', 0)
+    if not interval:
+        return None
+
+    def run():
+        while True:
+            time.sleep(interval)
+            with app.app_context():
+                try:
+                    deleted = purge_expired_tokens(app.config.get('BLOCKLIST_PURGE_BATCH_SIZE', 1000))
+                    app.logger.info('Purged %d expired tokens from the blocklist', deleted)
+                except Exception:
+                    db.session.rollback()
+                    app.logger.exception('Blocklist purge failed')
+                finally:
+                    db.session.remove()
+
+    thread = threading.Thread(target=run, name='blocklist-purge', daemon=True)
+    thread.start()
+    return thread
+
+@click.command('purge-blocklist')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows deleted per transaction.')
+@with_appcontext
+def purge_blocklist_command(batch_size):
+    """Delete revoked tokens that have already expired."""
+    deleted = purge_expired_tokens(batch_size)
+    click.echo(f"Deleted {deleted} expired tokens from the blocklist")
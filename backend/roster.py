@@ -0,0 +1,148 @@
+import csv
+import io
+import json
+import os
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import insert, or_
+from sqlalchemy.exc import IntegrityError
+
+from main import db
+from models import User
+from passwords import hash_passwords
+
+# Rows per uniqueness query, to stay under SQLite's bound-parameter limit
+BATCH_SIZE = 500
+
+# Rows hashed and committed together, so a long import keeps what it has done so far
+HASH_BATCH_SIZE = 50
+
+REQUIRED_FIELDS = ('username', 'password', 'email')
+
+class RosterError(ValueError):
+    """Raised when a roster file cannot be parsed at all."""
+
+def parse_roster(text, fmt):
+    """Parse a CSV or JSON roster into a list of dicts."""
+    if fmt == 'csv':
+        return [dict(row) for row in csv.DictReader(io.StringIO(text))]
+
+    if fmt == 'json':
+        try:
+            data = json.loads(text)
+        except ValueError as e:
+            raise RosterError(f'Invalid JSON: {e}')
+        if isinstance(data, dict):
+            data = data.get('users')
+        if not isinstance(data, list):
+            raise RosterError('Expected a list of users')
+        return data
+
+    raise RosterError(f'Unsupported roster format: {fmt}')
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def _taken(usernames, emails):
+    """Return the usernames and emails that already exist, one query per batch."""
+    taken_usernames, taken_emails = set(), set()
+    for username_chunk, email_chunk in zip(_chunks(usernames, BATCH_SIZE), _chunks(emails, BATCH_SIZE)):
+        rows = db.session.query(User.username, User.email) \
+            .filter(or_(User.username.in_(username_chunk), User.email.in_(email_chunk)))
+        for username, email in rows:
+            taken_usernames.add(username)
+            taken_emails.add(email)
+    return taken_usernames, taken_emails
+
+def _insert_batch(batch, failed):
+    """Insert a batch in one transaction, retrying row by row if another writer got there first."""
+    try:
+        db.session.execute(insert(User), [row for _, row in batch])
+        db.session.commit()
+        return len(batch)
+    except IntegrityError:
+        db.session.rollback()
+
+    created = 0
+    for index, row in batch:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(User), [row])
+            created += 1
+        except IntegrityError:
+            failed.append({'row': index, 'username': row['username'], 'message': 'Username or email already exists'})
+    db.session.commit()
+    return created
+
+def import_roster(rows):
+    """Create users from roster rows.
+
+    Rows that are invalid or clash with existing users are reported back
+    instead of aborting the import. Passwords are hashed and users inserted
+    HASH_BATCH_SIZE at a time, each batch in its own transaction. Returns a
+    dict with the number of users created and a list of failures, each with
+    its 1-based row number.
+    """
+    failed = []
+    candidates = []
+    seen_usernames, seen_emails = set(), set()
+
+    for index, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            failed.append({'row': index, 'username': None, 'message': 'Row must be an object'})
+            continue
+
+        values = {field: (str(row.get(field) or '')).strip() for field in REQUIRED_FIELDS}
+        if not all(values.values()):
+            failed.append({'row': index, 'username': values['username'] or None, 'message': 'Missing fields'})
+        elif values['username'] in seen_usernames:
+            failed.append({'row': index, 'username': values['username'], 'message': 'Duplicate username in roster'})
+        elif values['email'] in seen_emails:
+            failed.append({'row': index, 'username': values['username'], 'message': 'Duplicate email in roster'})
+        else:
+            seen_usernames.add(values['username'])
+            seen_emails.add(values['email'])
+            candidates.append((index, values))
+
+    taken_usernames, taken_emails = _taken(
+        [values['username'] for _, values in candidates],
+        [values['email'] for _, values in candidates]
+    )
+
+    accepted = []
+    for index, values in candidates:
+        if values['username'] in taken_usernames:
+            failed.append({'row': index, 'username': values['username'], 'message': 'Username already exists'})
+        elif values['email'] in taken_emails:
+            failed.append({'row': index, 'username': values['username'], 'message': 'Email already exists'})
+        else:
+            accepted.append((index, values))
+
+    created = 0
+    for batch in _chunks(accepted, HASH_BATCH_SIZE):
+        hashes = hash_passwords([values['password'] for _, values in batch])
+        for (_, values), password_hash in zip(batch, hashes):
+            values['password'] = password_hash
+        created += _insert_batch(batch, failed)
+
+    failed.sort(key=lambda failure: failure['row'])
+    return {'created': created, 'failed': failed}
+
+@click.command('import-roster')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'json']), help='Defaults to the file extension.')
+@with_appcontext
+def import_roster_command(path, fmt):
+    """Register every user listed in a CSV or JSON roster file."""
+    fmt = fmt or os.path.splitext(path)[1].lstrip('.').lower()
+    with open(path, encoding='utf-8-sig') as f:  # Excel starts CSV exports with a byte order mark
+        try:
+            rows = parse_roster(f.read(), fmt)
+        except RosterError as e:
+            raise click.ClickException(str(e))
+
+    result = import_roster(rows)
+    for failure in result['failed']:
+        click.echo(f"Row {failure['row']} ({failure['username']}): {failure['message']}", err=True)
+    click.echo(f"Created {result['created']} users, {len(result['failed'])} failed")
@@ -0,0 +1,124 @@
+from datetime import datetime, timedelta, timezone
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, current_user
+
+stats_bp = Blueprint('stats', __name__)
+
+# History window for /stats/overview when ?days= is not given, and the longest a client may ask for
+DEFAULT_OVERVIEW_DAYS = 30
+MAX_OVERVIEW_DAYS = 365
+
+# Topics returned by /stats/weakest when ?k= is not given, and the most a client may ask for
+DEFAULT_WEAKEST_COUNT = 5
+MAX_WEAKEST_COUNT = 50
+
+# Import models after creating blueprint to avoid circular imports
+from main import db
+from models import Template, Topic, Stat, DailyTopicStat
+
+@stats_bp.route('/stats/overview', methods=['GET'])
+@jwt_required()
+def get_overview():
+    """Get the statistics dashboard for the current user from the daily rollups.
+
+    ?days= sets how many days of history to cover, including today.
+    """
+    days = request.args.get('days', DEFAULT_OVERVIEW_DAYS, type=int)
+    days = max(1, min(days, MAX_OVERVIEW_DAYS))
+    since = datetime.now(timezone.utc).date() - timedelta(days=days - 1)
+    
+    # One range scan over the user's rollups, oldest day first
+    rows = db.session.query(
+            DailyTopicStat.day, DailyTopicStat.template_id, Template.subject, Template.topics,
+            Topic.name, DailyTopicStat.attempts, DailyTopicStat.correct, DailyTopicStat.difficulty,
+            DailyTopicStat.opening_difficulty
+        ) \
+        .join(Template, DailyTopicStat.template_id == Template.id) \
+        .join(Topic, DailyTopicStat.topic_id == Topic.id) \
+        .filter(DailyTopicStat.user_id == current_user.id, DailyTopicStat.day >= since, Template.deleting.is_(False)) \
+        .order_by(DailyTopicStat.day)
+    
+    templates = {}
+    history = {}
+    for row in rows:
+        template = templates.setdefault(row.template_id, {
+            'id': row.template_id,
+            'name': row.subject or row.topics,
+            'attempts': 0,
+            'correct': 0,
+            'topics': {}
+        })
+        template['attempts'] += row.attempts
+        template['correct'] += row.correct
+        
+        topic = template['topics'].setdefault(row.name, {
+            'topic': row.name,
+            'attempts': 0,
+            'correct': 0,
+            'first_difficulty': row.opening_difficulty
+        })
+        topic['attempts'] += row.attempts
+        topic['correct'] += row.correct
+        topic['difficulty'] = row.difficulty
+        
+        day = history.setdefault(row.day, {'day': row.day.isoformat(), 'attempts': 0, 'correct': 0})
+        day['attempts'] += row.attempts
+        day['correct'] += row.correct
+    
+    templates_list = []
+    for template in templates.values():
+        topics_list = []
+        for topic in template['topics'].values():
+            first_difficulty = topic.pop('first_difficulty')
+            topic['score'] = score(topic['correct'], topic['attempts'])
+            topic['trend'] = trend(first_difficulty, topic['difficulty'])
+            topics_list.append(topic)
+        template['topics'] = topics_list
+        template['score'] = score(template['correct'], template['attempts'])
+        templates_list.append(template)
+    
+    return jsonify({
+        'since': since.isoformat(),
+        'templates': templates_list,
+        'history': list(history.values())
+    }), 200
+
+@stats_bp.route('/stats/weakest', methods=['GET'])
+@jwt_required()
+def get_weakest_topics():
+    """Get the current user's k hardest topics across all their templates.
+
+    Reads the last k entries of the user's (user_id, difficulty) index, so the
+    cost depends on k and not on how many topics the user has answered.
+    """
+    k = request.args.get('k', DEFAULT_WEAKEST_COUNT, type=int)
+    k = max(1, min(k, MAX_WEAKEST_COUNT))
+    
+    stats = db.session.query(Stat.template_id, Stat.topic, Stat.difficulty, Stat.trend) \
+        .join(Template, Stat.template_id == Template.id) \
+        .filter(Stat.user_id == current_user.id, Template.deleting.is_(False)) \
+        .order_by(Stat.difficulty.desc(), Stat.id.desc()) \
+        .limit(k)
+    
+    return jsonify([
+        {
+            'template_id': stat.template_id,
+            'topic': stat.topic,
+            'difficulty': stat.difficulty,
+            'trend': stat.trend
+        }
+        for stat in stats
+    ]), 200
+
+# Helper functions for dashboard figures
+def score(correct, attempts):
+    """Percentage of correct answers, or None before the first attempt."""
+    return round(100 * correct / attempts) if attempts else None
+
+def trend(first_difficulty, last_difficulty):
+    """Direction the difficulty moved over the window, named like Stat.trend."""
+    if last_difficulty > first_difficulty:
+        return 'increasing'
+    if last_difficulty < first_difficulty:
+        return 'decreasing'
+    return 'stable'
@@ -1,30 +1,42 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+import hashlib
+from flask import Blueprint, request, jsonify, url_for, abort, make_response, current_app
+from flask_jwt_extended import jwt_required, current_user
+from sqlalchemy import and_, or_, func, select, update
+from sqlalchemy.orm import load_only, undefer
 
 template_bp = Blueprint('template', __name__)
 
+# Page size for list endpoints when ?limit= is not given, and the most a client may ask for
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Question columns a client may ask for with ?fields=; answer and solution are never sent
+QUESTION_FIELDS = ('id', 'type', 'topic', 'points', 'options')
+DEFAULT_QUESTION_FIELDS = ('id', 'type', 'topic', 'options')
+
 # Import models after creating blueprint to avoid circular imports
 from main import db
-from models import User, Template, Exam, Question, Stat
+from models import User, Template, Exam, Question, Stat, AnswerEvent
+from answers import record_answers
+from grading import grade, grade_many
+from json_provider import raw_json
+from compression import etag_variants
+from deletion import delete_templates, delete_template_in_background
+from template_import import validate_templates, import_templates
 
 @template_bp.route('/templates', methods=['POST'])
 @jwt_required()
 def create_template():
     """Create a new template for the current user."""
-    current_user = get_jwt_identity()
-    user = User.query.filter_by(username=current_user).first()
-    
-    if not user:
-        return jsonify({'message': 'User not found'}), 404
-    
     data = request.get_json()
     topics = data.get('topics')
     
     if not topics:
         return jsonify({'message': 'Topics are required'}), 400
     
-    template = Template(topics=topics, user_id=user.id)
+    template = Template(topics=topics, user_id=current_user.id)
     db.session.add(template)
+    bump_versions(user_id=current_user.id)
     db.session.commit()
     
     return jsonify({
@@ -32,76 +44,107 @@ def create_template():
         'topics': template.topics
     }), 201
 
+@template_bp.route('/templates/bulk', methods=['POST'])
+@jwt_required()
+def create_templates():
+    """Create many templates for the current user in one transaction.
+
+    Takes {"templates": [...]} or a bare list. Each template has topics, an
+    optional subject and optional questions, which go into one exam. Nothing
+    is written unless every template is valid.
+    """
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get('templates')
+    
+    templates, failed = validate_templates(data)
+    if failed:
+        return jsonify({'message': 'Invalid templates', 'failed': failed}), 400
+    
+    created = import_templates(current_user.id, templates)
+    bump_versions(user_id=current_user.id)
+    db.session.commit()
+    
+    return jsonify({'templates': created}), 201
+
 @template_bp.route('/templates', methods=['GET'])
 @jwt_required()
 def get_templates():
     """Get all templates for the current user."""
-    current_user = get_jwt_identity()
-    user = User.query.filter_by(username=current_user).first()
-    
-    if not user:
-        return jsonify({'message': 'User not found'}), 404
-    
-    templates = Template.query.filter_by(user_id=user.id).all()
+    etag = row_etag('templates', current_user.id, user_data_version())
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    
+    limit, after = page_params()
+    templates = Template.query.filter(
+            Template.user_id == current_user.id, Template.deleting.is_(False), Template.id > (after or 0)
+        ) \
+        .order_by(Template.id) \
+        .limit(limit + 1) \
+        .all()
     templates_list = []
     
-    for template in templates:
+    for template in templates[:limit]:
         templates_list.append({
             'id': template.id,
             'topics': template.topics
         })
     
-    return jsonify(templates_list), 200
+    next_after = templates[limit - 1].id if len(templates) > limit else None
+    return with_etag(paged_response(templates_list, limit, next_after), etag), 200
 
 @template_bp.route('/templates/<int:template_id>', methods=['GET'])
 @jwt_required()
 def get_template(template_id):
-    """Get a specific template by ID."""
-    current_user = get_jwt_identity()
-    user = User.query.filter_by(username=current_user).first()
-    
-    if not user:
-        return jsonify({'message': 'User not found'}), 404
-    
-    template = Template.query.filter_by(id=template_id, user_id=user.id).first()
+    """Get a specific template by ID.
+
+    ?include= lists the nested collections to return (stats, exams); both by default.
+    """
+    include = field_params('include', ('stats', 'exams'))
+    template = db.session.query(
+            Template.id, Template.topics, Template.stamp, Template.version, last_answer_id(Template.id)
+        ) \
+        .filter_by(id=template_id, user_id=current_user.id, deleting=False) \
+        .first()
     
     if not template:
         return jsonify({'message': 'Template not found'}), 404
     
-    # Get stats for this template
-    stats = []
-    for stat in template.stats:
-        stats.append({
-            'topic': stat.topic,
-            'difficulty': stat.difficulty,
-            'trend': stat.trend
-        })
+    # Answers change the stats, but not the topics or the exams
+    versions = (template.stamp, template.version) + ((template.last_answer_id,) if 'stats' in include else ())
+    etag = row_etag('template', template.id, *versions)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    
+    response = {
+        'id': template.id,
+        'topics': template.topics
+    }
+    
+    # Get stats for this template, reading only the columns returned
+    if 'stats' in include:
+        stats = db.session.query(Stat.topic, Stat.difficulty, Stat.trend) \
+            .filter(Stat.template_id == template.id) \
+            .order_by(Stat.id)
+        response['stats'] = [
+            {'topic': stat.topic, 'difficulty': stat.difficulty, 'trend': stat.trend}
+            for stat in stats
+        ]
     
     # Get exams for this template
-    exams = []
-    for exam in template.exams:
-        exams.append({
-            'id': exam.id
-        })
+    if 'exams' in include:
+        exams = db.session.query(Exam.id).filter(Exam.template_id == template.id).order_by(Exam.id)
+        response['exams'] = [{'id': exam.id} for exam in exams]
     
-    return jsonify({
-        'id': template.id,
-        'topics': template.topics,
-        'stats': stats,
-        'exams': exams
-    }), 200
+    return with_etag(jsonify(response), etag), 200
 
 @template_bp.route('/templates/<int:template_id>', methods=['PUT'])
 @jwt_required()
 def update_template(template_id):
     """Update a specific template."""
-    current_user = get_jwt_identity()
-    user = User.query.filter_by(username=current_user).first()
-    
-    if not user:
-        return jsonify({'message': 'User not found'}), 404
-    
-    template = Template.query.filter_by(id=template_id, user_id=user.id).first()
+    template = Template.query.filter_by(id=template_id, user_id=current_user.id, deleting=False).first()
     
     if not template:
         return jsonify({'message': 'Template not found'}), 404
@@ -111,6 +154,7 @@ def update_template(template_id):
     
     if topics:
         template.topics = topics
+        bump_versions(template.id, current_user.id)
     
     db.session.commit()
     
@@ -122,19 +166,27 @@ def update_template(template_id):
 @template_bp.route('/templates/<int:template_id>', methods=['DELETE'])
 @jwt_required()
 def delete_template(template_id):
-    """Delete a specific template."""
-    current_user = get_jwt_identity()
-    user = User.query.filter_by(username=current_user).first()
-    
-    if not user:
-        return jsonify({'message': 'User not found'}), 404
-    
-    template = Template.query.filter_by(id=template_id, user_id=user.id).first()
+    """Delete a specific template with its exams, questions and stats.
+
+    ?background=true answers 202 straight away and deletes in batches on a
+    background worker, for templates too large to delete within a request.
+    The template is flagged first, which hides it at once and lets a restart
+    resume the delete if the worker dies.
+    """
+    template = db.session.query(Template.id).filter_by(id=template_id, user_id=current_user.id, deleting=False).first()
     
     if not template:
         return jsonify({'message': 'Template not found'}), 404
     
-    db.session.delete(template)
+    if request.args.get('background', '').lower() in ('1', 'true', 'yes'):
+        db.session.execute(update(Template).where(Template.id == template.id).values(deleting=True))
+        bump_versions(template.id, current_user.id)
+        db.session.commit()
+        delete_template_in_background(current_app._get_current_object(), template.id)
+        return jsonify({'message': 'Template deletion started'}), 202
+    
+    delete_templates([template.id])
+    bump_versions(user_id=current_user.id)
     db.session.commit()
     
     return jsonify({'message': 'Template deleted successfully'}), 200
@@ -143,13 +195,7 @@ def delete_template(template_id):
 @jwt_required()
 def create_exam(template_id):
     """Create a new exam from a template."""
-    current_user = get_jwt_identity()
-    user = User.query.filter_by(username=current_user).first()
-    
-    if not user:
-        return jsonify({'message': 'User not found'}), 404
-    
-    template = Template.query.filter_by(id=template_id, user_id=user.id).first()
+    template = Template.query.filter_by(id=template_id, user_id=current_user.id, deleting=False).first()
     
     if not template:
         return jsonify({'message': 'Template not found'}), 404
@@ -157,6 +203,7 @@ def create_exam(template_id):
     # Create a new exam
     exam = Exam(template_id=template.id)
     db.session.add(exam)
+    bump_versions(template.id, current_user.id)
     db.session.commit()
     
     # TODO: Generate questions based on template topics
@@ -172,114 +219,115 @@ def create_exam(template_id):
 @jwt_required()
 def get_user_exams():
     """Get all exams for the current user."""
-    current_user = get_jwt_identity()
-    user = User.query.filter_by(username=current_user).first()
-    
-    if not user:
-        return jsonify({'message': 'User not found'}), 404
-    
-    # Get all templates for the user
-    templates = Template.query.filter_by(user_id=user.id).all()
+    etag = row_etag('exams', current_user.id, user_data_version())
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    
+    limit, after = page_params(exam_cursor)
+    
+    # One query for every exam of every template the user owns. Ordering by
+    # (template, exam) follows the indexes, so a page is read without sorting.
+    exams = db.session.query(Exam.id, Exam.template_id, Template.topics, Exam.question_count) \
+        .join(Template, Exam.template_id == Template.id) \
+        .filter(Template.user_id == current_user.id, Template.deleting.is_(False))
+    if after:
+        after_template_id, after_exam_id = after
+        exams = exams.filter(
+            Template.id >= after_template_id,
+            or_(Template.id > after_template_id, Exam.id > after_exam_id)
+        )
+    exams = exams.order_by(Template.id, Exam.id).limit(limit + 1).all()
     
-    # Get all exams for all user templates
     exams_list = []
-    for template in templates:
-        for exam in template.exams:
-            exams_list.append({
-                'id': exam.id,
-                'template_id': exam.template_id,
-                'template_topics': template.topics,
-                'question_count': len(exam.questions)
-            })
+    for exam in exams[:limit]:
+        exams_list.append({
+            'id': exam.id,
+            'template_id': exam.template_id,
+            'template_topics': exam.topics,
+            'question_count': exam.question_count
+        })
     
-    return jsonify(exams_list), 200
+    next_after = None
+    if len(exams) > limit:
+        next_after = f'{exams[limit - 1].template_id}-{exams[limit - 1].id}'
+    return with_etag(paged_response(exams_list, limit, next_after), etag), 200
 
 @template_bp.route('/templates/<int:template_id>/exams', methods=['GET'])
 @jwt_required()
 def get_template_exams(template_id):
     """Get all exams for a specific template."""
-    current_user = get_jwt_identity()
-    user = User.query.filter_by(username=current_user).first()
-    
-    if not user:
-        return jsonify({'message': 'User not found'}), 404
-    
-    template = Template.query.filter_by(id=template_id, user_id=user.id).first()
+    template = Template.query.filter_by(id=template_id, user_id=current_user.id, deleting=False).first()
     
     if not template:
         return jsonify({'message': 'Template not found'}), 404
     
+    etag = row_etag('template exams', template.id, template.stamp, template.version)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    
+    limit, after = page_params()
+    exams = Exam.query.options(undefer(Exam.question_count)) \
+        .filter(Exam.template_id == template.id, Exam.id > (after or 0)) \
+        .order_by(Exam.id) \
+        .limit(limit + 1) \
+        .all()
     exams_list = []
-    for exam in template.exams:
+    for exam in exams[:limit]:
         exams_list.append({
             'id': exam.id,
             'template_id': exam.template_id,
-            'question_count': len(exam.questions)
+            'question_count': exam.question_count
         })
     
-    return jsonify(exams_list), 200
+    next_after = exams[limit - 1].id if len(exams) > limit else None
+    return with_etag(paged_response(exams_list, limit, next_after), etag), 200
 
 @template_bp.route('/exams/<int:exam_id>', methods=['GET'])
 @jwt_required()
 def get_exam(exam_id):
-    """Get a specific exam with its questions."""
-    current_user = get_jwt_identity()
-    user = User.query.filter_by(username=current_user).first()
-    
-    if not user:
-        return jsonify({'message': 'User not found'}), 404
-    
-    # Find the exam
-    exam = Exam.query.get(exam_id)
-    
-    if not exam:
-        return jsonify({'message': 'Exam not found'}), 404
-    
-    # Make sure the exam belongs to a template owned by this user
-    template = Template.query.get(exam.template_id)
-    if template.user_id != user.id:
-        return jsonify({'message': 'Unauthorized access to this exam'}), 403
-    
-    # Get questions for this exam
-    questions_list = []
-    for question in exam.questions:
-        questions_list.append({
-            'id': question.id,
-            'type': question.type,
-            'topic': question.topic,
-            'options': question.options,
-            # Don't include the answer in the response for security
-        })
+    """Get a specific exam with its questions.
+
+    ?include=questions (the default) returns the questions, ?include= leaves them out.
+    ?fields= picks the question columns, from id, type, topic, points and options.
+    """
+    include = field_params('include', ('questions',))
+    fields = field_params('fields', QUESTION_FIELDS, DEFAULT_QUESTION_FIELDS)
     
-    return jsonify({
+    exam, versions, _ = resolve_exam(exam_id)
+    
+    etag = row_etag('exam', exam.id, *versions)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    
+    response = {
         'id': exam.id,
-        'template_id': exam.template_id,
-        'questions': questions_list
-    }), 200
+        'template_id': exam.template_id
+    }
+    
+    # Get questions for this exam. Only the requested columns are selected, so
+    # the answer never leaves the database and large options are read on demand.
+    if 'questions' in include:
+        questions = db.session.query(*(getattr(Question, field) for field in fields)) \
+            .filter(Question.exam_id == exam.id) \
+            .order_by(Question.id)
+        response['questions'] = []
+        for question in questions:
+            question = dict(question._mapping)
+            if 'options' in question:
+                # Already stored as JSON, so sent as a JSON value without decoding it first
+                question['options'] = raw_json(question['options'])
+            response['questions'].append(question)
+    
+    return with_etag(jsonify(response), etag), 200
 
 @template_bp.route('/exams/<int:exam_id>/questions/<int:question_id>/answer', methods=['POST'])
 @jwt_required()
 def submit_answer(exam_id, question_id):
     """Submit an answer for a question and update stats accordingly."""
-    current_user = get_jwt_identity()
-    user = User.query.filter_by(username=current_user).first()
-    
-    if not user:
-        return jsonify({'message': 'User not found'}), 404
-    
-    # Find the exam and question
-    exam = Exam.query.get(exam_id)
-    if not exam:
-        return jsonify({'message': 'Exam not found'}), 404
-    
-    question = Question.query.get(question_id)
-    if not question:
-        return jsonify({'message': 'Question not found'}), 404
-    
-    # Make sure the exam belongs to a template owned by this user
-    template = Template.query.get(exam.template_id)
-    if template.user_id != user.id:
-        return jsonify({'message': 'Unauthorized access to this exam'}), 403
+    exam, _, question = resolve_exam(exam_id, question_id)
     
     # Get the submitted answer
     data = request.get_json()
@@ -287,48 +335,82 @@ def submit_answer(exam_id, question_id):
     if submitted_answer is None:
         return jsonify({'message': 'Answer is required'}), 400
     
-    # Check if the answer is correct (simplified for this example)
-    is_correct = submitted_answer.lower() == question.answer.lower()
+    # Check if the answer is correct, allowing for equivalent numbers, spelling and option letters
+    correct_answer = question.answer
+    is_correct = grade(question, submitted_answer)
     
     # Update stats based on the answer
-    update_stats(template.id, question.topic, is_correct)
+    update_stats(exam.template_id, [(question, is_correct)])
     
     return jsonify({
         'is_correct': is_correct,
-        'correct_answer': question.answer
+        'correct_answer': correct_answer
+    }), 200
+
+@template_bp.route('/exams/<int:exam_id>/answers', methods=['POST'])
+@jwt_required()
+def submit_answers(exam_id):
+    """Submit answers for several questions of an exam at once.
+
+    Expects {"answers": [{"question_id": 1, "answer": "..."}, ...]}. Every
+    answer is graded and all stat changes are committed together; if any
+    answer is invalid nothing is recorded.
+    """
+    data = request.get_json(silent=True) or {}
+    answers = data.get('answers')
+    if not isinstance(answers, list) or not answers:
+        return jsonify({'message': 'Answers are required'}), 400
+    for item in answers:
+        if not isinstance(item, dict) or not isinstance(item.get('question_id'), int) \
+                or not isinstance(item.get('answer'), str):
+            return jsonify({'message': 'Each answer needs an integer question_id and a string answer'}), 400
+    
+    exam, _, _ = resolve_exam(exam_id)
+    
+    # Load every answered question of this exam in one query
+    question_ids = {item['question_id'] for item in answers}
+    questions = {
+        question.id: question
+        for question in db.session.query(Question.id, Question.exam_id, Question.answer, Question.options, Question.topic)
+            .filter(Question.exam_id == exam.id, Question.id.in_(question_ids))
+    }
+    missing = sorted(question_ids - questions.keys())
+    if missing:
+        return jsonify({'message': 'Question not found', 'question_ids': missing}), 404
+    
+    # Grade them together; each question's grader is compiled once and cached
+    answered = [questions[item['question_id']] for item in answers]
+    outcomes = list(zip(answered, grade_many(zip(answered, (item['answer'] for item in answers)))))
+    results = [
+        {
+            'question_id': question.id,
+            'is_correct': is_correct,
+            'correct_answer': question.answer
+        }
+        for question, is_correct in outcomes
+    ]
+    
+    update_stats(exam.template_id, outcomes)
+    
+    return jsonify({
+        'results': results,
+        'correct': sum(result['is_correct'] for result in results),
+        'total': len(results)
     }), 200
 
 @template_bp.route('/exams/<int:exam_id>/questions/<int:question_id>/clarify', methods=['POST'])
 @jwt_required()
 def request_clarification(exam_id, question_id):
     """Request clarification for a question and update stats."""
-    current_user = get_jwt_identity()
-    user = User.query.filter_by(username=current_user).first()
-    
-    if not user:
-        return jsonify({'message': 'User not found'}), 404
-    
-    # Find the exam and question
-    exam = Exam.query.get(exam_id)
-    if not exam:
-        return jsonify({'message': 'Exam not found'}), 404
-    
-    question = Question.query.get(question_id)
-    if not question:
-        return jsonify({'message': 'Question not found'}), 404
-    
-    # Make sure the exam belongs to a template owned by this user
-    template = Template.query.get(exam.template_id)
-    if template.user_id != user.id:
-        return jsonify({'message': 'Unauthorized access to this exam'}), 403
-    
-    # Update stats to reflect that the user needed clarification
-    update_stats(template.id, question.topic, False)
+    exam, _, question = resolve_exam(exam_id, question_id)
     
     # In a real app, you would generate a clarification using an AI/ML model
     # For now, return a simple message
     clarification = f"This question is about {question.topic}. Think about the key concepts related to this topic."
     
+    # Update stats to reflect that the user needed clarification
+    update_stats(exam.template_id, [(question, False)], kind='clarification')
+    
     return jsonify({
         'clarification': clarification
     }), 200
@@ -337,19 +419,25 @@ def request_clarification(exam_id, question_id):
 @jwt_required()
 def get_template_stats(template_id):
     """Get all stats for a specific template."""
-    current_user = get_jwt_identity()
-    user = User.query.filter_by(username=current_user).first()
-    
-    if not user:
-        return jsonify({'message': 'User not found'}), 404
-    
-    template = Template.query.filter_by(id=template_id, user_id=user.id).first()
+    template = db.session.query(Template.id, Template.stamp, Template.version, last_answer_id(Template.id)) \
+        .filter_by(id=template_id, user_id=current_user.id, deleting=False) \
+        .first()
     
     if not template:
         return jsonify({'message': 'Template not found'}), 404
     
+    etag = row_etag('template stats', template.id, template.stamp, template.version, template.last_answer_id)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    
+    limit, after = page_params()
+    stats = Stat.query.filter(Stat.template_id == template.id, Stat.id > (after or 0)) \
+        .order_by(Stat.id) \
+        .limit(limit + 1) \
+        .all()
     stats_list = []
-    for stat in template.stats:
+    for stat in stats[:limit]:
         stats_list.append({
             'id': stat.id,
             'topic': stat.topic,
@@ -357,32 +445,154 @@ def get_template_stats(template_id):
             'trend': stat.trend
         })
     
-    return jsonify(stats_list), 200
+    next_after = stats[limit - 1].id if len(stats) > limit else None
+    return with_etag(paged_response(stats_list, limit, next_after), etag), 200
 
-# Helper function to update stats based on user performance
-def update_stats(template_id, topic, is_correct):
-    """Update the stats for a topic based on whether the answer was correct."""
-    # Find the stat for this topic
-    stat = Stat.query.filter_by(template_id=template_id, topic=topic).first()
-    
-    if not stat:
-        # Create a new stat if it doesn't exist
-        stat = Stat(
-            topic=topic,
-            difficulty=5.0,  # Middle difficulty to start
-            trend="stable",
-            template_id=template_id
+# Helper functions for query parameters of list and read endpoints
+def page_params(parse_cursor=int):
+    """Read ?limit= and ?after= from the request.
+
+    after is the cursor returned in the previous page's Link header, by default
+    the id of the last item on that page. A malformed cursor answers 400.
+    """
+    limit = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    after = request.args.get('after')
+    if after:
+        try:
+            after = parse_cursor(after)
+        except ValueError:
+            abort_json('Invalid cursor', 400)
+    return max(1, min(limit, MAX_PAGE_SIZE)), after or None
+
+def field_params(name, allowed, default=None):
+    """Read a comma-separated ?name= list of values from allowed.
+
+    A missing parameter means default (all of allowed if not given), an empty
+    one means none. Unknown values answer 400.
+    """
+    value = request.args.get(name)
+    if value is None:
+        return tuple(default or allowed)
+    
+    requested = []
+    for item in value.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        if item not in allowed:
+            abort_json(f'Unknown {name} value: {item}', 400)
+        if item not in requested:
+            requested.append(item)
+    return tuple(requested)
+
+def exam_cursor(value):
+    """Parse the "template_id-exam_id" cursor used by /exams."""
+    template_id, exam_id = value.split('-')
+    return int(template_id), int(exam_id)
+
+def paged_response(items, limit, next_after):
+    """Return the page as a JSON list, with a Link header pointing at the next page if there is one."""
+    response = jsonify(items)
+    if next_after is not None:
+        next_url = url_for(request.endpoint, **request.view_args, limit=limit, after=next_after)
+        response.headers['Link'] = f'<{next_url}>; rel="next"'
+    return response
+
+def abort_json(message, status):
+    """Stop the request with a {"message": ...} error like the routes return."""
+    abort(make_response(jsonify({'message': message}), status))
+
+# Helper function to authorize exam and question routes
+def resolve_exam(exam_id, question_id=None):
+    """Load an exam of the current user's and, if asked, one of its questions, in one joined query.
+
+    Returns (exam, the versions its ETag derives from, question or None). Answers 404 if the
+    exam does not exist or the question is not part of it, and 403 if the
+    exam belongs to another user.
+    """
+    query = db.session.query(Exam, Template.user_id, Template.stamp) \
+        .join(Template, Exam.template_id == Template.id) \
+        .filter(Exam.id == exam_id, Template.deleting.is_(False)) \
+        .options(load_only(Exam.id, Exam.template_id, Exam.version))
+    if question_id is not None:
+        # Outer join, so a question of another exam reads as missing rather than hiding the exam
+        query = query.add_entity(Question) \
+            .outerjoin(Question, and_(Question.id == question_id, Question.exam_id == Exam.id)) \
+            .options(load_only(Question.id, Question.exam_id, Question.topic, Question.answer, Question.options))
+    
+    row = query.first()
+    if row is None:
+        abort_json('Exam not found', 404)
+    exam, owner_id, template_stamp, *question = row
+    if owner_id != current_user.id:
+        abort_json('Unauthorized access to this exam', 403)
+    
+    question = question[0] if question else None
+    if question_id is not None and question is None:
+        abort_json('Question not found', 404)
+    return exam, (template_stamp, exam.version), question
+
+# Helper functions for conditional GETs
+def row_etag(kind, row_id, *versions):
+    """Return a strong ETag for a payload built from one row at the given versions.
+
+    Pass the template's stamp along with counters that restart at 1, since a
+    new row may reuse a deleted one's id. The query string is part of it, as
+    ?limit=, ?after=, ?include= and ?fields= all change the body.
+    """
+    key = f"{kind}:{row_id}:{':'.join(str(version) for version in versions)}:{request.query_string.decode()}"
+    return hashlib.sha1(key.encode()).hexdigest()
+
+def not_modified(etag):
+    """Return a 304 response if If-None-Match already has this ETag, or None.
+
+    The ETags of the compressed bodies count as well, and the 304 repeats the
+    one that matched.
+    """
+    for variant in etag_variants(etag):
+        if variant in request.if_none_match:
+            return with_etag(make_response('', 304), variant)
+    return None
+
+def with_etag(response, etag):
+    response.set_etag(etag)
+    # Per-user data: browsers may keep it but must revalidate every time
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def user_data_version():
+    return db.session.query(User.data_version).filter(User.id == current_user.id).scalar()
+
+def last_answer_id(template_id):
+    """Select the id of the template's newest answer event, which stats ETags are derived from.
+
+    Events are only ever added while a template lives, so this changes with
+    every answer without a counter being written. One seek on
+    ix_answer_event_template_id.
+    """
+    return select(func.max(AnswerEvent.id)) \
+        .where(AnswerEvent.template_id == template_id) \
+        .scalar_subquery() \
+        .label('last_answer_id')
+
+def bump_versions(template_id=None, user_id=None):
+    """Change the ETags of a template's payloads and/or a user's lists.
+
+    Answers are not covered: stats payloads follow last_answer_id instead.
+    Incremented in SQL, so concurrent writers cannot lose a bump. Runs in the
+    caller's transaction.
+    """
+    if template_id is not None:
+        db.session.execute(
+            update(Template).where(Template.id == template_id).values(version=Template.version + 1)
+        )
+    if user_id is not None:
+        db.session.execute(
+            update(User).where(User.id == user_id).values(data_version=User.data_version + 1)
         )
-        db.session.add(stat)
-    
-    # Update difficulty based on answer correctness
-    if is_correct:
-        # If answer is correct, decrease difficulty (user understands better)
-        stat.difficulty = max(1.0, stat.difficulty - 0.5)
-        stat.trend = "decreasing" if stat.difficulty < 5.0 else "stable"
-    else:
-        # If answer is wrong or clarification requested, increase difficulty
-        stat.difficulty = min(10.0, stat.difficulty + 1.0)
-        stat.trend = "increasing" if stat.difficulty > 5.0 else "stable"
-    
-    db.session.commit()
\ No newline at end of file
+
+# Helper function to update stats based on user performance
+def update_stats(template_id, outcomes, kind='answer'):
+    """Record (question, is_correct) outcomes and update the template's stats in one transaction."""
+    record_answers(current_user.id, template_id, outcomes, kind)
+    db.session.commit()
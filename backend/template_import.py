@@ -0,0 +1,144 @@
+import json
+from sqlalchemy import insert
+
+from main import db
+from models import Template, Exam, Question
+from topics import intern_topics, link_template_topics
+
+# The most templates one request may create
+MAX_IMPORT_TEMPLATES = 500
+
+QUESTION_TYPES = ('open', 'closed')
+
+def _text(value):
+    return value.strip() if isinstance(value, str) else ''
+
+def _validate_question(question):
+    """Return (question row without exam_id, None) or (None, error message)."""
+    if not isinstance(question, dict):
+        return None, 'must be an object'
+
+    row = {
+        'type': question.get('type') or 'open',
+        'answer': _text(question.get('answer')),
+        'topic': _text(question.get('topic')),
+        'points': question.get('points'),
+        'options': question.get('options'),
+        'solution': question.get('solution'),
+    }
+    if row['type'] not in QUESTION_TYPES:
+        return None, 'type must be open or closed'
+    if not row['answer'] or not row['topic']:
+        return None, 'answer and topic are required'
+    if row['points'] is not None and (not isinstance(row['points'], int) or isinstance(row['points'], bool)):
+        return None, 'points must be an integer'
+    if row['type'] == 'closed':
+        options = row['options']
+        if not isinstance(options, list) or not options or not all(isinstance(option, str) for option in options):
+            return None, 'closed questions need a list of options'
+        row['options'] = json.dumps(options)
+    else:
+        row['options'] = None
+    # Stored as JSON text, like the solutions the generator writes
+    row['solution'] = json.dumps(row['solution']) if row['solution'] is not None else None
+    return row, None
+
+def validate_templates(items):
+    """Check every template before anything is written.
+
+    Returns (templates, failures). Each template is a dict with topics,
+    subject and a list of question rows; each failure names its 1-based row.
+    """
+    if not isinstance(items, list) or not items:
+        return [], [{'row': None, 'message': 'Expected a non-empty list of templates'}]
+    if len(items) > MAX_IMPORT_TEMPLATES:
+        return [], [{'row': None, 'message': f'At most {MAX_IMPORT_TEMPLATES} templates per request'}]
+
+    templates = []
+    failed = []
+    for index, item in enumerate(items, start=1):
+        if not isinstance(item, dict):
+            failed.append({'row': index, 'message': 'Template must be an object'})
+            continue
+
+        topics = _text(item.get('topics'))
+        if not topics:
+            failed.append({'row': index, 'message': 'Topics are required'})
+            continue
+
+        questions = item.get('questions') or []
+        if not isinstance(questions, list):
+            failed.append({'row': index, 'message': 'Questions must be a list'})
+            continue
+
+        rows = []
+        for number, question in enumerate(questions, start=1):
+            row, error = _validate_question(question)
+            if error:
+                failed.append({'row': index, 'message': f'Question {number}: {error}'})
+                break
+            rows.append(row)
+        else:
+            templates.append({'topics': topics, 'subject': _text(item.get('subject')) or None, 'questions': rows})
+
+    return templates, failed
+
+def _insert_returning_ids(session, model, rows, keys):
+    """Insert rows in one executemany and return their ids in the same order.
+
+    RETURNING does not promise any row order (and asking SQLAlchemy for one
+    makes it insert row by row on SQLite), so ids are matched back to rows by
+    the columns in keys. Rows with equal keys are identical, so which of them
+    gets which id does not matter. Dialects without RETURNING for executemany
+    insert one row at a time.
+    """
+    if not session.get_bind().dialect.insert_executemany_returning:
+        return [session.execute(insert(model), row).inserted_primary_key[0] for row in rows]
+
+    ids_by_key = {}
+    statement = insert(model).returning(model.id, *(getattr(model, key) for key in keys))
+    for row_id, *key in session.execute(statement, rows):
+        ids_by_key.setdefault(tuple(key), []).append(row_id)
+    for ids in ids_by_key.values():
+        ids.sort(reverse=True)
+    return [ids_by_key[tuple(row[key] for key in keys)].pop() for row in rows]
+
+def import_templates(user_id, templates, session=None):
+    """Write templates validated by validate_templates in a few batched statements.
+
+    Templates that come with questions get one exam holding them. Runs in the
+    caller's transaction. Returns a list of {id, topics, exam_id} in input order.
+    """
+    session = session or db.session
+    template_ids = _insert_returning_ids(session, Template, [
+        {'subject': template['subject'], 'topics': template['topics'], 'user_id': user_id}
+        for template in templates
+    ], keys=('subject', 'topics'))
+    link_template_topics(session, {
+        template_id: template['topics'] for template_id, template in zip(template_ids, templates)
+    })
+
+    with_questions = [
+        (template_id, template) for template_id, template in zip(template_ids, templates) if template['questions']
+    ]
+    exam_ids = _insert_returning_ids(session, Exam, [
+        {'subject': template['subject'], 'template_id': template_id} for template_id, template in with_questions
+    ], keys=('template_id',)) if with_questions else []
+
+    question_rows = []
+    for exam_id, (_, template) in zip(exam_ids, with_questions):
+        for row in template['questions']:
+            question_rows.append({**row, 'exam_id': exam_id})
+    if question_rows:
+        names = list({row['topic'] for row in question_rows})
+        id_by_name = dict(zip(names, intern_topics(names, session)))
+        for row in question_rows:
+            row['topic_id'] = id_by_name[row['topic']]
+        # Questions without points, options or solution would otherwise go into separate batches
+        session.execute(insert(Question).execution_options(render_nulls=True), question_rows)
+
+    exam_by_template = {template_id: exam_id for exam_id, (template_id, _) in zip(exam_ids, with_questions)}
+    return [
+        {'id': template_id, 'topics': template['topics'], 'exam_id': exam_by_template.get(template_id)}
+        for template_id, template in zip(template_ids, templates)
+    ]
@@ -10,6 +10,11 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from test_models import ModelTestCase
 from test_auth_routes import AuthRoutesTestCase
 from test_template_routes import TemplateRoutesTestCase
+from test_stats_routes import StatsRoutesTestCase
+from test_grading import GradingTestCase
+from test_json_provider import JSONProviderTestCase
+from test_export import ExportTestCase
+from test_compression import CompressionTestCase
 
 def run_tests():
     """Run all test cases."""
@@ -20,6 +25,11 @@ def run_tests():
     test_suite.addTest(unittest.makeSuite(ModelTestCase))
     test_suite.addTest(unittest.makeSuite(AuthRoutesTestCase))
     test_suite.addTest(unittest.makeSuite(TemplateRoutesTestCase))
+    test_suite.addTest(unittest.makeSuite(StatsRoutesTestCase))
+    test_suite.addTest(unittest.makeSuite(GradingTestCase))
+    test_suite.addTest(unittest.makeSuite(JSONProviderTestCase))
+    test_suite.addTest(unittest.makeSuite(ExportTestCase))
+    test_suite.addTest(unittest.makeSuite(CompressionTestCase))
     
     # Run the tests
     runner = unittest.TextTestRunner(verbosity=2)
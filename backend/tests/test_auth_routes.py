@@ -1,14 +1,23 @@
+import io
 import os
 import sys
+import tempfile
 import unittest
 import json
+from datetime import datetime, timedelta
+from unittest import mock
+from concurrent.futures.process import BrokenProcessPool
 from flask_jwt_extended import create_access_token
+from sqlalchemy import event
 
 # Add parent directory to path so we can import modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from main import app, db
-from models import User
+from models import User, TokenBlocklist
+from revocation import revocation_cache, purge_expired_tokens
+import passwords
+import roster
 
 class AuthRoutesTestCase(unittest.TestCase):
     """Test cases for authentication routes."""
@@ -90,6 +99,103 @@ class AuthRoutesTestCase(unittest.TestCase):
         self.assertEqual(response.status_code, 409)
         self.assertEqual(data['message'], 'Email already exists')
     
+    def test_register_bulk(self):
+        """Test importing a roster with a mix of valid and invalid rows."""
+        with app.app_context():
+            db.session.add(User(username='teacher', password='password123', email='teacher@example.com'))
+            db.session.commit()
+            access_token = create_access_token(identity='teacher')
+        
+        response = self.app.post('/register/bulk',
+                                json=[
+                                    {'username': 'alice', 'password': 'pw1', 'email': 'alice@example.com'},
+                                    {'username': 'bob', 'password': 'pw2', 'email': 'bob@example.com'},
+                                    {'username': 'alice', 'password': 'pw3', 'email': 'alice2@example.com'},
+                                    {'username': 'teacher', 'password': 'pw4', 'email': 'new@example.com'},
+                                    {'username': 'carol', 'email': 'carol@example.com'}
+                                ],
+                                headers={'Authorization': f'Bearer {access_token}'})
+        data = json.loads(response.data)
+        
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(data['created'], 2)
+        self.assertEqual([(f['row'], f['message']) for f in data['failed']], [
+            (3, 'Duplicate username in roster'),
+            (4, 'Username already exists'),
+            (5, 'Missing fields')
+        ])
+        
+        # CSV rosters go through the same path
+        response = self.app.post('/register/bulk',
+                                data='username,password,email\ndave,pw5,dave@example.com\n',
+                                content_type='text/csv',
+                                headers={'Authorization': f'Bearer {access_token}'})
+        self.assertEqual(json.loads(response.data)['created'], 1)
+        
+        # Excel saves CSV with a byte order mark in front of the first header
+        excel_csv = '\ufeffusername,password,email\r\nerin,pw6,erin@example.com\r\n'.encode('utf-8')
+        response = self.app.post('/register/bulk', data=excel_csv, content_type='text/csv',
+                                headers={'Authorization': f'Bearer {access_token}'})
+        self.assertEqual(json.loads(response.data)['created'], 1)
+        response = self.app.post('/register/bulk',
+                                data={'file': (io.BytesIO(excel_csv.replace(b'erin', b'frank')), 'roster.csv')},
+                                headers={'Authorization': f'Bearer {access_token}'})
+        self.assertEqual(json.loads(response.data)['created'], 1)
+        
+        runner = app.test_cli_runner()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'roster.csv')
+            with open(path, 'wb') as f:
+                f.write(excel_csv.replace(b'erin', b'grace'))
+            result = runner.invoke(args=['import-roster', path])
+        self.assertIn('Created 1 users', result.output)
+        
+        # Imported users can log in
+        response = self.app.post('/login', json={'username': 'bob', 'password': 'pw2'})
+        self.assertEqual(response.status_code, 200)
+        
+        with app.app_context():
+            self.assertEqual(User.query.count(), 7)
+    
+    def test_register_bulk_row_limit(self):
+        """Test that rosters too large to hash within a request are sent to the CLI."""
+        with app.app_context():
+            db.session.add(User(username='teacher', password='password123', email='teacher@example.com'))
+            db.session.commit()
+            access_token = create_access_token(identity='teacher')
+        
+        rows = [{'username': f'user{i}', 'password': 'pw', 'email': f'user{i}@example.com'} for i in range(3)]
+        max_rows = app.config['ROSTER_MAX_ROWS_PER_REQUEST']
+        app.config['ROSTER_MAX_ROWS_PER_REQUEST'] = 2
+        try:
+            response = self.app.post('/register/bulk', json=rows, headers={'Authorization': f'Bearer {access_token}'})
+        finally:
+            app.config['ROSTER_MAX_ROWS_PER_REQUEST'] = max_rows
+        
+        self.assertEqual(response.status_code, 413)
+        self.assertIn('flask import-roster', json.loads(response.data)['message'])
+        with app.app_context():
+            self.assertEqual(User.query.count(), 1)
+    
+    def test_import_roster_commits_each_batch(self):
+        """Test that a large import hashes and commits in batches, keeping earlier batches if a later one fails."""
+        rows = [{'username': f'user{i}', 'password': 'pw', 'email': f'user{i}@example.com'} for i in range(5)]
+        calls = []
+        def hash_batch(passwords):
+            calls.append(len(passwords))
+            if len(calls) == 3:
+                raise TimeoutError
+            return [f'hash{i}' for i in range(len(passwords))]
+        
+        with app.app_context():
+            with mock.patch.object(roster, 'HASH_BATCH_SIZE', 2), \
+                    mock.patch.object(roster, 'hash_passwords', side_effect=hash_batch):
+                with self.assertRaises(TimeoutError):
+                    roster.import_roster(rows)
+            db.session.rollback()
+            self.assertEqual(calls, [2, 2, 1])
+            self.assertEqual(User.query.count(), 4)
+    
     def test_login_route(self):
         """Test user login endpoint."""
         # Register user first
@@ -132,6 +238,30 @@ class AuthRoutesTestCase(unittest.TestCase):
         self.assertEqual(response.status_code, 401)
         self.assertEqual(data['message'], 'Invalid credentials')
     
+    def test_login_upgrades_old_password_hash(self):
+        """Test that a hash made with another method is replaced on successful login."""
+        from werkzeug.security import generate_password_hash, check_password_hash
+        with app.app_context():
+            user = User(
+                username='testuser',
+                password=generate_password_hash('password123', method='pbkdf2:sha256:1000'),
+                email='test@example.com'
+            )
+            db.session.add(user)
+            db.session.commit()
+        
+        response = self.app.post('/login', 
+                                json={
+                                    'username': 'testuser',
+                                    'password': 'password123'
+                                })
+        self.assertEqual(response.status_code, 200)
+        
+        with app.app_context():
+            user = User.query.filter_by(username='testuser').first()
+            self.assertTrue(user.password.startswith(app.config['PASSWORD_HASH_METHOD']))
+            self.assertTrue(check_password_hash(user.password, 'password123'))
+    
     def test_profile_route(self):
         """Test profile endpoint with JWT auth."""
         with app.app_context():
@@ -156,6 +286,127 @@ class AuthRoutesTestCase(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(data['Username'], 'testuser')
         self.assertEqual(data['Email'], 'test@example.com')
+    
+    def test_profile_uses_cached_user(self):
+        """Test that a login token resolves its user from the cache after the first request."""
+        self.app.post('/register', 
+                    json={
+                        'username': 'testuser',
+                        'password': 'password123',
+                        'email': 'test@example.com'
+                    })
+        response = self.app.post('/login', 
+                                json={
+                                    'username': 'testuser',
+                                    'password': 'password123'
+                                })
+        headers = {'Authorization': f"Bearer {json.loads(response.data)['access_token']}"}
+        
+        response = self.app.get('/profile', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        
+        # Count queries against the user table on the second request
+        statements = []
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', record)
+        try:
+            response = self.app.get('/profile', headers=headers)
+        finally:
+            event.remove(engine, 'before_cursor_execute', record)
+        data = json.loads(response.data)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data['username'], 'testuser')
+        self.assertEqual(data['email'], 'test@example.com')
+        self.assertEqual([s for s in statements if 'FROM user' in s], [])
+    
+    def test_password_pool_recovers_from_dead_worker(self):
+        """Test that hashing keeps working after a pool worker process dies."""
+        workers = app.config['PASSWORD_HASH_WORKERS']
+        app.config['PASSWORD_HASH_WORKERS'] = 1
+        try:
+            with app.app_context():
+                broken = passwords._get_pool()
+                with self.assertRaises(BrokenProcessPool):
+                    broken.submit(os._exit, 1).result(timeout=30)
+                
+                password_hash = passwords.hash_password('secret')
+                self.assertTrue(passwords.verify_password(password_hash, 'secret'))
+                self.assertIsNot(passwords._get_pool(), broken)
+        finally:
+            app.config['PASSWORD_HASH_WORKERS'] = workers
+    
+    def test_logout_revokes_token(self):
+        """Test that a token stops working after logout and later checks are served from the cache."""
+        revocation_cache.reset()
+        with app.app_context():
+            db.session.add(User(username='testuser', password='password123', email='test@example.com'))
+            db.session.commit()
+            access_token = create_access_token(identity='testuser')
+        headers = {'Authorization': f'Bearer {access_token}'}
+        
+        response = self.app.post('/logout', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        
+        with app.app_context():
+            self.assertEqual(TokenBlocklist.query.count(), 1)
+        
+        # The revoked token is rejected without another blocklist query
+        hits_before = revocation_cache.stats()['hits']
+        response = self.app.post('/logout', headers=headers)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(revocation_cache.stats()['hits'], hits_before + 1)
+    
+    def test_revocation_cache_picks_up_other_workers(self):
+        """Test that jtis written by another process are found on refresh."""
+        revocation_cache.reset()
+        with app.app_context():
+            # Simulate a logout handled by a different worker
+            db.session.add(TokenBlocklist(jti='revoked-elsewhere', expires_at=datetime.utcnow() + timedelta(days=1)))
+            db.session.commit()
+            
+            self.assertTrue(revocation_cache.is_revoked('revoked-elsewhere'))
+            self.assertFalse(revocation_cache.is_revoked('still-valid'))
+            self.assertEqual(revocation_cache.stats()['misses'], 1)
+    
+    def test_revocation_cache_picks_up_late_commits(self):
+        """Test that a row committed after a newer one was synced is still found, as on PostgreSQL."""
+        revocation_cache.reset()
+        refresh_seconds = app.config['REVOCATION_CACHE_REFRESH_SECONDS']
+        app.config['REVOCATION_CACHE_REFRESH_SECONDS'] = 0
+        try:
+            with app.app_context():
+                now = datetime.utcnow()
+                expires_at = now + timedelta(days=1)
+                db.session.add(TokenBlocklist(id=100, jti='committed-first', created_at=now, expires_at=expires_at))
+                db.session.commit()
+                self.assertTrue(revocation_cache.is_revoked('committed-first'))
+                
+                # A transaction that started earlier took a lower id and commits only now
+                db.session.add(TokenBlocklist(id=50, jti='committed-late', created_at=now - timedelta(seconds=30),
+                                              expires_at=expires_at))
+                db.session.commit()
+                self.assertTrue(revocation_cache.is_revoked('committed-late'))
+        finally:
+            app.config['REVOCATION_CACHE_REFRESH_SECONDS'] = refresh_seconds
+    
+    def test_purge_expired_tokens(self):
+        """Test that only expired blocklist rows are purged, in batches."""
+        with app.app_context():
+            now = datetime.utcnow()
+            for i in range(5):
+                db.session.add(TokenBlocklist(jti=f'expired-{i}', expires_at=now - timedelta(days=1)))
+            db.session.add(TokenBlocklist(jti='active', expires_at=now + timedelta(days=1)))
+            db.session.commit()
+            
+            deleted = purge_expired_tokens(batch_size=2)
+            
+            self.assertEqual(deleted, 5)
+            remaining = [token.jti for token in TokenBlocklist.query.all()]
+            self.assertEqual(remaining, ['active'])
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
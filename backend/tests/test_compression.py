@@ -0,0 +1,134 @@
+import os
+import sys
+import unittest
+import json
+import gzip
+from unittest import mock
+from flask_jwt_extended import create_access_token
+from werkzeug.datastructures import Accept
+
+# Add parent directory to path so we can import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import app, db
+from models import User, Template, Exam, Question
+import compression
+
+class CompressionTestCase(unittest.TestCase):
+    """Test cases for response compression."""
+    
+    def setUp(self):
+        """Set up test database and client."""
+        app.config['TESTING'] = True
+        self.app = app.test_client()
+        app.extensions['compression_cache'].clear()
+        with app.app_context():
+            db.create_all()
+            
+            # Create test user with an exam large enough to be compressed
+            self.user = User(username='testuser', password='password123', email='test@example.com')
+            db.session.add(self.user)
+            db.session.commit()
+            template = Template(topics='math', user_id=self.user.id)
+            db.session.add(template)
+            db.session.commit()
+            exam = Exam(template_id=template.id)
+            db.session.add(exam)
+            db.session.commit()
+            db.session.add_all([
+                Question(type='closed', topic='math', answer='a', options=json.dumps([f'option {i}' for i in range(10)]), exam_id=exam.id)
+                for _ in range(20)
+            ])
+            db.session.commit()
+            self.template_id = template.id
+            self.exam_id = exam.id
+            
+            # Create access token for authentication
+            self.access_token = create_access_token(identity=self.user.username)
+            self.headers = {'Authorization': f'Bearer {self.access_token}'}
+    
+    def tearDown(self):
+        """Tear down test database."""
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+    
+    def test_gzip(self):
+        """Test that large responses are gzipped for clients that accept it, and cached by ETag."""
+        plain = self.app.get(f'/exams/{self.exam_id}', headers=self.headers)
+        self.assertNotIn('Content-Encoding', plain.headers)
+        self.assertEqual(plain.headers['Vary'], 'Accept-Encoding')
+        etag = plain.headers['ETag'].strip('"')
+        
+        headers = {**self.headers, 'Accept-Encoding': 'gzip, deflate'}
+        with mock.patch.object(compression.gzip, 'compress', wraps=gzip.compress) as compress:
+            for _ in range(3):
+                response = self.app.get(f'/exams/{self.exam_id}', headers=headers)
+                self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+                self.assertEqual(response.headers['ETag'], f'"{etag}-gzip"')
+                self.assertEqual(gzip.decompress(response.data), plain.data)
+                self.assertLess(len(response.data), len(plain.data))
+        self.assertEqual(compress.call_count, 1)
+        
+        # The compressed body's ETag revalidates too
+        response = self.app.get(f'/exams/{self.exam_id}', headers={**headers, 'If-None-Match': f'"{etag}-gzip"'})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers['ETag'], f'"{etag}-gzip"')
+    
+    def test_cache_is_per_user(self):
+        """Test that equal ETags of different users' payloads do not share a cached body."""
+        with app.app_context():
+            other = User(username='otheruser', password='password123', email='other@example.com')
+            db.session.add(other)
+            db.session.commit()
+            template = Template(topics='science', user_id=other.id)
+            db.session.add(template)
+            db.session.commit()
+            exam = Exam(template_id=template.id)
+            db.session.add(exam)
+            db.session.commit()
+            other_headers = {'Authorization': f'Bearer {create_access_token(identity=other.username)}'}
+        
+        # Both exam lists get the same ETag, as if two users' versions had collided
+        min_size = app.config['COMPRESS_MIN_SIZE']
+        app.config['COMPRESS_MIN_SIZE'] = 0
+        try:
+            with mock.patch('template_module.row_etag', return_value='same'):
+                for headers in (self.headers, other_headers):
+                    plain = self.app.get('/exams', headers=headers)
+                    response = self.app.get('/exams', headers={**headers, 'Accept-Encoding': 'gzip'})
+                    self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+                    self.assertEqual(gzip.decompress(response.data), plain.data)
+        finally:
+            app.config['COMPRESS_MIN_SIZE'] = min_size
+    
+    def test_small_and_uncompressible_responses(self):
+        """Test that bodies under the threshold, and errors, are sent as they are."""
+        headers = {**self.headers, 'Accept-Encoding': 'gzip'}
+        response = self.app.get(f'/templates/{self.template_id}', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Content-Encoding', response.headers)
+        
+        response = self.app.get('/exams/0', headers=headers)
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('Content-Encoding', response.headers)
+        
+        min_size = app.config['COMPRESS_MIN_SIZE']
+        app.config['COMPRESS_MIN_SIZE'] = 0
+        try:
+            response = self.app.get(f'/templates/{self.template_id}', headers=headers)
+        finally:
+            app.config['COMPRESS_MIN_SIZE'] = min_size
+        self.assertEqual(json.loads(gzip.decompress(response.data))['id'], self.template_id)
+    
+    def test_choose_encoding(self):
+        """Test that the client's preference wins, and ties go to brotli."""
+        encoders = {'br': None, 'gzip': None}
+        self.assertEqual(compression.choose_encoding(Accept([('gzip', 1), ('br', 1)]), encoders), 'br')
+        self.assertEqual(compression.choose_encoding(Accept([('gzip', 1), ('br', 0.5)]), encoders), 'gzip')
+        self.assertEqual(compression.choose_encoding(Accept([('br', 1)]), {'gzip': None}), None)
+        self.assertEqual(compression.choose_encoding(Accept([('*', 1)]), {'gzip': None}), 'gzip')
+        self.assertEqual(compression.choose_encoding(Accept([]), encoders), None)
+
+if __name__ == '__main__':
+    unittest.main()
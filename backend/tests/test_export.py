@@ -0,0 +1,106 @@
+import os
+import sys
+import unittest
+import json
+import gzip
+from unittest import mock
+from flask_jwt_extended import create_access_token
+
+# Add parent directory to path so we can import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import app, db, export_module
+from models import User, Template, Exam, Question, Stat
+
+class ExportTestCase(unittest.TestCase):
+    """Test cases for the NDJSON export."""
+    
+    def setUp(self):
+        """Set up test database and client."""
+        app.config['TESTING'] = True
+        self.app = app.test_client()
+        with app.app_context():
+            db.create_all()
+            
+            # Create test user with one template, exam, question and stat, and another user with a template
+            self.user = User(username='testuser', password='password123', email='test@example.com')
+            other = User(username='otheruser', password='password123', email='other@example.com')
+            db.session.add_all([self.user, other])
+            db.session.commit()
+            
+            template = Template(subject='Math', topics='algebra', user_id=self.user.id)
+            db.session.add_all([template, Template(topics='history', user_id=other.id)])
+            db.session.commit()
+            exam = Exam(template_id=template.id)
+            db.session.add(exam)
+            db.session.commit()
+            db.session.add_all([
+                Question(type='closed', topic='algebra', answer='b', options='["1", "2"]', solution='"x"', exam_id=exam.id),
+                Question(type='open', topic='algebra', answer='2', exam_id=exam.id),
+                Stat(topic='algebra', difficulty=5.0, trend='up', template_id=template.id)
+            ])
+            db.session.commit()
+            self.template_id = template.id
+            self.exam_id = exam.id
+            
+            # Create access token for authentication
+            self.access_token = create_access_token(identity=self.user.username)
+            self.headers = {'Authorization': f'Bearer {self.access_token}'}
+    
+    def tearDown(self):
+        """Tear down test database."""
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+    
+    def _records(self, body):
+        return [json.loads(line) for line in body.decode().splitlines()]
+    
+    def test_export(self):
+        """Test that the export streams the user's own records as NDJSON, without answers."""
+        response = self.app.get('/export', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        self.assertNotIn('Content-Encoding', response.headers)
+        
+        records = self._records(response.data)
+        self.assertEqual([record['record'] for record in records], ['template', 'exam', 'question', 'question', 'stat'])
+        self.assertEqual(records[0], {'record': 'template', 'id': self.template_id, 'subject': 'Math', 'topics': 'algebra'})
+        self.assertEqual(records[2]['options'], ['1', '2'])
+        self.assertIsNone(records[3]['options'])
+        for record in records:
+            self.assertNotIn('answer', record)
+            self.assertNotIn('solution', record)
+    
+    def test_export_gzip(self):
+        """Test that the export is gzipped on the fly for clients that accept it, in small batches."""
+        plain = self.app.get('/export', headers=self.headers).data
+        with mock.patch.object(export_module, 'CHUNK_SIZE', 1):
+            app.config['EXPORT_BATCH_SIZE'] = 1
+            try:
+                response = self.app.get('/export', headers={**self.headers, 'Accept-Encoding': 'gzip'})
+            finally:
+                app.config['EXPORT_BATCH_SIZE'] = 1000
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.headers['Vary'], 'Accept-Encoding')
+        self.assertEqual(gzip.decompress(response.data), plain)
+    
+    def test_export_command(self):
+        """Test that the CLI writes the same export, gzipped on request."""
+        plain = self.app.get('/export', headers=self.headers).data
+        runner = app.test_cli_runner()
+        
+        result = runner.invoke(args=['export-data', 'testuser'])
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(result.stdout_bytes, plain)
+        
+        result = runner.invoke(args=['export-data', 'testuser', '--gzip'])
+        self.assertEqual(gzip.decompress(result.stdout_bytes), plain)
+        
+        result = runner.invoke(args=['export-data', 'nobody'])
+        self.assertNotEqual(result.exit_code, 0)
+        self.assertIn('No user named nobody', result.output)
+
+if __name__ == '__main__':
+    unittest.main()
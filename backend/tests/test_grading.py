@@ -0,0 +1,62 @@
+import os
+import sys
+import unittest
+from collections import namedtuple
+
+# Add parent directory to path so we can import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from grading import compile_grader, grade_many, fold_text
+
+Question = namedtuple('Question', 'answer options')
+
+OPTIONS = '["10", "42", "100", "1000"]'
+
+class GradingTestCase(unittest.TestCase):
+    """Test cases for answer grading."""
+    
+    def test_text_folding(self):
+        """Test that case, whitespace, trailing punctuation and diacritics are ignored."""
+        self.assertEqual(fold_text('  Zażółć   GĘŚLĄ jaźń. '), 'zazolc gesla jazn')
+        self.assertTrue(compile_grader('Łódź')('lodz'))
+        self.assertTrue(compile_grader('Mitochondria')('  mitochondria!'))
+        self.assertFalse(compile_grader('Mitochondria')('ribosome'))
+    
+    def test_numbers(self):
+        """Test that equivalent fractions and decimals match, allowing only the stored answer's rounding."""
+        grader = compile_grader('1/2')
+        for submitted in ('0.5', '0,5', '.5', '2/4', ' 1 / 2 '):
+            self.assertTrue(grader(submitted), submitted)
+        self.assertFalse(grader('0.6'))
+        self.assertTrue(compile_grader('3.1416')('3.14159'))
+        self.assertFalse(compile_grader('3.14159')('3.1416'))
+        self.assertFalse(compile_grader('3.142')('3.14'))
+        self.assertFalse(compile_grader('100')('101'))
+        self.assertFalse(compile_grader('1410')('1411'))
+        self.assertFalse(compile_grader('2024')('2025'))
+        self.assertTrue(compile_grader('1410')('1410.0'))
+        self.assertFalse(compile_grader('1/3')('0.333'))
+        self.assertFalse(compile_grader('1/0')('0'))
+    
+    def test_option_letters(self):
+        """Test that closed questions accept the option letter, its text or its value."""
+        grader = compile_grader('42', OPTIONS)
+        for submitted in ('b', 'B)', '(b)', '42', '42.0'):
+            self.assertTrue(grader(submitted), submitted)
+        for submitted in ('a', 'e', '100'):
+            self.assertFalse(grader(submitted), submitted)
+        # The stored answer may itself be a letter
+        self.assertTrue(compile_grader('C', OPTIONS)('100'))
+    
+    def test_grade_many(self):
+        """Test grading a batch, with graders compiled once per question."""
+        compile_grader.cache_clear()
+        open_question = Question('Paris', None)
+        closed_question = Question('42', OPTIONS)
+        pairs = [(open_question, 'paris'), (closed_question, 'b'), (open_question, 'Rome'), (closed_question, 'a')]
+        
+        self.assertEqual(grade_many(pairs), [True, True, False, False])
+        self.assertEqual(compile_grader.cache_info().currsize, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import sys
+import unittest
+import json
+from datetime import datetime
+
+# Add parent directory to path so we can import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import app
+from json_provider import FastJSONProvider, RawJSON, raw_json, orjson
+
+class JSONProviderTestCase(unittest.TestCase):
+    """Test cases for the JSON provider."""
+    
+    def _providers(self):
+        """Yield a provider for every backend available here."""
+        backend = app.config['JSON_BACKEND']
+        try:
+            for name in ('orjson', 'json') if orjson else ('json',):
+                app.config['JSON_BACKEND'] = name
+                yield name, FastJSONProvider(app)
+        finally:
+            app.config['JSON_BACKEND'] = backend
+    
+    def test_raw_json_is_spliced(self):
+        """Test that RawJSON values are written as JSON values, and match the default provider otherwise."""
+        value = {
+            'options': RawJSON('["10", "42"]'),
+            'nested': [raw_json(''), RawJSON(b'{"a": 1}')],
+            'text': 'zażółć',
+            'when': datetime(2024, 1, 2, 3, 4, 5),
+        }
+        expected = {
+            'options': ['10', '42'],
+            'nested': [None, {'a': 1}],
+            'text': 'zażółć',
+            'when': 'Tue, 02 Jan 2024 03:04:05 GMT',
+        }
+        for name, provider in self._providers():
+            self.assertEqual(json.loads(provider.dumps(value)), expected, name)
+            self.assertEqual(provider.loads(provider.dumps(expected)), expected, name)
+    
+    def test_strings_are_not_spliced(self):
+        """Test that a string that looks like a stand-in is left alone."""
+        for name, provider in self._providers():
+            encoded = provider.dumps({'raw': RawJSON('1'), 'text': '0:0'})
+            self.assertEqual(json.loads(encoded), {'raw': 1, 'text': '0:0'}, name)
+    
+    def test_jsonify_uses_provider(self):
+        """Test that jsonify responses go through the provider."""
+        self.assertIsInstance(app.json, FastJSONProvider)
+        with app.test_request_context():
+            response = app.json.response({'options': RawJSON('[1, 2]')})
+        self.assertEqual(response.mimetype, 'application/json')
+        self.assertEqual(json.loads(response.get_data()), {'options': [1, 2]})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,7 +8,9 @@ from flask_sqlalchemy import SQLAlchemy
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from main import app, db
-from models import User, Template, Exam, Question, Stat
+from models import User, Template, Exam, Question, Stat, Topic
+from query_plans import explain_queries, full_scans
+from topics import intern_topic, topic_cache
 
 class ModelTestCase(unittest.TestCase):
     """Test cases for database models."""
@@ -136,6 +138,86 @@ class ModelTestCase(unittest.TestCase):
             self.assertIsNotNone(closed_question)
             self.assertIsNone(open_question.options)
             self.assertIsNotNone(closed_question.options)
+    
+    def test_topics_are_interned(self):
+        """Test that topic names are stored once and referenced by id."""
+        with app.app_context():
+            user = User(username='testuser', password='password', email='test@example.com')
+            db.session.add(user)
+            db.session.commit()
+            
+            template = Template(topics='math, science', user_id=user.id)
+            db.session.add(template)
+            db.session.commit()
+            
+            stat = Stat(topic='math', difficulty=5.0, trend='stable', template_id=template.id)
+            db.session.add(stat)
+            db.session.commit()
+            
+            math = Topic.query.filter_by(name='math').first()
+            self.assertIsNotNone(math)
+            self.assertEqual(stat.topic_id, math.id)
+            self.assertEqual(sorted(topic.name for topic in template.topic_list), ['math', 'science'])
+            
+            # Changing the topic list relinks the template, reusing existing topics
+            template.topics = 'math,history'
+            db.session.commit()
+            db.session.expire(template)
+            
+            self.assertEqual(sorted(topic.name for topic in template.topic_list), ['history', 'math'])
+            self.assertEqual(Topic.query.count(), 3)
+    
+    def test_rolled_back_topics_are_not_cached(self):
+        """Test that a topic id from a rolled back transaction is not reused for another topic."""
+        with app.app_context():
+            ghost_id = intern_topic('ghost')
+            db.session.rollback()
+            
+            real_id = intern_topic('real')
+            self.assertEqual(intern_topic('ghost'), Topic.query.filter_by(name='ghost').one().id)
+            db.session.commit()
+            
+            self.assertNotEqual(intern_topic('ghost'), real_id)
+            self.assertEqual(topic_cache.get('real'), real_id)
+            self.assertEqual(Topic.query.filter_by(name='real').one().id, real_id)
+            self.assertIsNotNone(ghost_id)
+    
+    def test_exam_question_count(self):
+        """Test that the question count is computed in SQL when undeferred."""
+        from sqlalchemy.orm import undefer
+        with app.app_context():
+            user = User(username='testuser', password='password', email='test@example.com')
+            db.session.add(user)
+            db.session.commit()
+            
+            template = Template(topics='math', user_id=user.id)
+            db.session.add(template)
+            db.session.commit()
+            
+            full_exam = Exam(template_id=template.id)
+            empty_exam = Exam(template_id=template.id)
+            db.session.add_all([full_exam, empty_exam])
+            db.session.commit()
+            
+            db.session.add_all([
+                Question(type='open', answer=str(i), topic='math', exam_id=full_exam.id)
+                for i in range(3)
+            ])
+            db.session.commit()
+            full_id, empty_id = full_exam.id, empty_exam.id
+            db.session.expunge_all()
+            
+            counts = {
+                exam.id: exam.question_count
+                for exam in Exam.query.options(undefer(Exam.question_count))
+            }
+            self.assertEqual(counts, {full_id: 3, empty_id: 0})
+    
+    def test_blueprint_queries_use_indexes(self):
+        """Test that no blueprint query needs a full table scan."""
+        with app.app_context():
+            plans = explain_queries()
+            self.assertEqual(full_scans(plans), [])
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,141 @@
+import os
+import sys
+import unittest
+import json
+from datetime import datetime, timezone
+from flask_jwt_extended import create_access_token
+
+# Add parent directory to path so we can import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import app, db
+from models import User, Template, Exam, Question, Stat, DailyTopicStat
+
+class StatsRoutesTestCase(unittest.TestCase):
+    """Test cases for statistics routes."""
+    
+    def setUp(self):
+        """Set up test database and client."""
+        app.config['TESTING'] = True
+        self.app = app.test_client()
+        with app.app_context():
+            db.create_all()
+            
+            # Create test user
+            self.user = User(username='testuser', password='password123', email='test@example.com')
+            db.session.add(self.user)
+            db.session.commit()
+            
+            # Create access token for authentication
+            self.access_token = create_access_token(identity=self.user.username)
+            self.headers = {'Authorization': f'Bearer {self.access_token}'}
+    
+    def tearDown(self):
+        """Tear down test database."""
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+    
+    def _add_exam(self, subject, answers):
+        """Create a template with one exam and one question per (topic, answer); return their ids."""
+        with app.app_context():
+            template = Template(subject=subject, topics=','.join(topic for topic, _ in answers), user_id=self.user.id)
+            db.session.add(template)
+            db.session.commit()
+            exam = Exam(template_id=template.id)
+            db.session.add(exam)
+            db.session.commit()
+            questions = [Question(type='open', topic=topic, answer=answer, exam_id=exam.id) for topic, answer in answers]
+            db.session.add_all(questions)
+            db.session.commit()
+            return template.id, exam.id, [question.id for question in questions]
+    
+    def test_overview(self):
+        """Test that answers are rolled up per topic and day and served in one overview."""
+        template_id, exam_id, question_ids = self._add_exam('Math', [('algebra', '1'), ('geometry', '2')])
+        answers = [
+            {'question_id': question_ids[0], 'answer': '1'},
+            {'question_id': question_ids[0], 'answer': 'x'},
+            {'question_id': question_ids[1], 'answer': '2'},
+        ]
+        self.app.post(f'/exams/{exam_id}/answers', json={'answers': answers}, headers=self.headers)
+        self.app.post(f'/exams/{exam_id}/questions/{question_ids[0]}/answer', json={'answer': 'x'}, headers=self.headers)
+        
+        with app.app_context():
+            rollups = DailyTopicStat.query.filter_by(user_id=self.user.id).all()
+            self.assertEqual(len(rollups), 2)
+            self.assertTrue(all(rollup.day == datetime.now(timezone.utc).date() for rollup in rollups))
+        
+        response = self.app.get('/stats/overview', headers=self.headers)
+        data = json.loads(response.data)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(data['templates']), 1)
+        template = data['templates'][0]
+        self.assertEqual((template['id'], template['name']), (template_id, 'Math'))
+        self.assertEqual((template['attempts'], template['correct'], template['score']), (4, 2, 50))
+        
+        topics = {topic['topic']: topic for topic in template['topics']}
+        self.assertEqual((topics['algebra']['attempts'], topics['algebra']['correct']), (3, 1))
+        # 5.0 - 0.5 + 1.0 + 1.0, the stat's difficulty after the last answer
+        self.assertEqual(topics['algebra']['difficulty'], 6.5)
+        self.assertEqual((topics['geometry']['score'], topics['geometry']['difficulty']), (100, 4.5))
+        # Trends run from before the first answer, so a single day has one
+        self.assertEqual((topics['algebra']['trend'], topics['geometry']['trend']), ('increasing', 'decreasing'))
+        
+        response = self.app.get('/stats/overview?days=1', headers=self.headers)
+        topics = {topic['topic']: topic for topic in json.loads(response.data)['templates'][0]['topics']}
+        self.assertEqual((topics['algebra']['trend'], topics['geometry']['trend']), ('increasing', 'decreasing'))
+        
+        self.assertEqual(data['history'], [
+            {'day': datetime.now(timezone.utc).date().isoformat(), 'attempts': 4, 'correct': 2}
+        ])
+    
+    def test_overview_is_per_user(self):
+        """Test that the overview only covers the current user's answers."""
+        _, exam_id, question_ids = self._add_exam('Math', [('algebra', '1')])
+        self.app.post(f'/exams/{exam_id}/questions/{question_ids[0]}/answer', json={'answer': '1'}, headers=self.headers)
+        
+        with app.app_context():
+            other = User(username='other', password='password123', email='other@example.com')
+            db.session.add(other)
+            db.session.commit()
+            headers = {'Authorization': f'Bearer {create_access_token(identity=other.username)}'}
+        
+        response = self.app.get('/stats/overview?days=7', headers=headers)
+        data = json.loads(response.data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((data['templates'], data['history']), ([], []))
+
+    def test_weakest_topics(self):
+        """Test that the hardest topics across the user's templates come first."""
+        _, exam_id, question_ids = self._add_exam('Math', [('algebra', '1'), ('geometry', '2')])
+        other_template_id, other_exam_id, other_question_ids = self._add_exam('Physics', [('optics', '3')])
+        answers = [
+            {'question_id': question_ids[0], 'answer': 'x'},
+            {'question_id': question_ids[0], 'answer': 'x'},
+            {'question_id': question_ids[1], 'answer': '2'},
+        ]
+        self.app.post(f'/exams/{exam_id}/answers', json={'answers': answers}, headers=self.headers)
+        self.app.post(f'/exams/{other_exam_id}/questions/{other_question_ids[0]}/answer',
+                      json={'answer': 'x'}, headers=self.headers)
+        
+        with app.app_context():
+            # Stats created through the ORM get their owner from the template
+            stat = Stat(topic='mechanics', difficulty=9.5, trend='increasing', template_id=other_template_id)
+            db.session.add(stat)
+            db.session.commit()
+            self.assertEqual(stat.user_id, self.user.id)
+        
+        response = self.app.get('/stats/weakest?k=3', headers=self.headers)
+        data = json.loads(response.data)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(stat['topic'], stat['difficulty']) for stat in data],
+                         [('mechanics', 9.5), ('algebra', 7.0), ('optics', 6.0)])
+        
+        response = self.app.get('/stats/weakest', headers=self.headers)
+        self.assertEqual(len(json.loads(response.data)), 4)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,13 +2,17 @@ import os
 import sys
 import unittest
 import json
+import threading
+from unittest import mock
 from flask_jwt_extended import create_access_token
+from sqlalchemy import event
 
 # Add parent directory to path so we can import modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from main import app, db
-from models import User, Template, Stat, Exam, Question
+from models import User, Template, Stat, Exam, Question, AnswerEvent, DailyTopicStat, template_topic
+import deletion
 
 class TemplateRoutesTestCase(unittest.TestCase):
     """Test cases for template-related routes."""
@@ -54,6 +58,60 @@ class TemplateRoutesTestCase(unittest.TestCase):
             self.assertEqual(template.topics, 'math,science,history')
             self.assertEqual(template.user_id, self.user.id)
     
+    def test_create_templates_in_bulk(self):
+        """Test that many templates, with and without questions, are created with a fixed number of statements."""
+        templates = [{'topics': f'topic{i},shared', 'subject': f'Subject {i}'} for i in range(100)]
+        templates[0]['questions'] = [
+            {'type': 'closed', 'topic': 'topic0', 'answer': 'b', 'options': ['1', '2'], 'points': 2},
+            {'topic': 'shared', 'answer': '42', 'solution': {'steps': ['6 * 7']}}
+        ]
+        response, statements = self._record_queries(
+            lambda: self.app.post('/templates/bulk', json={'templates': templates}, headers=self.headers)
+        )
+        data = json.loads(response.data)
+        
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(data['templates']), 100)
+        self.assertEqual([template['topics'] for template in data['templates']], [t['topics'] for t in templates])
+        self.assertIsNotNone(data['templates'][0]['exam_id'])
+        self.assertIsNone(data['templates'][1]['exam_id'])
+        # Batched: the statement count does not depend on the number of templates
+        self.assertLess(len(statements), 20)
+        
+        with app.app_context():
+            self.assertEqual(Template.query.filter_by(user_id=self.user.id).count(), 100)
+            self.assertEqual(db.session.query(template_topic).count(), 200)
+            questions = Question.query.filter_by(exam_id=data['templates'][0]['exam_id']).order_by(Question.id).all()
+            self.assertEqual([question.options for question in questions], ['["1", "2"]', None])
+            self.assertEqual(json.loads(questions[1].solution), {'steps': ['6 * 7']})
+            self.assertTrue(all(question.topic_id for question in questions))
+        
+        response = self.app.get(f"/exams/{data['templates'][0]['exam_id']}", headers=self.headers)
+        self.assertEqual(json.loads(response.data)['questions'][0]['options'], ['1', '2'])
+        
+        # A bare list works as well
+        response = self.app.post('/templates/bulk', json=[{'topics': 'math'}], headers=self.headers)
+        self.assertEqual(response.status_code, 201)
+    
+    def test_create_templates_in_bulk_validation(self):
+        """Test that one invalid template rejects the whole batch."""
+        templates = [
+            {'topics': 'math'},
+            {'subject': 'No topics'},
+            {'topics': 'history', 'questions': [{'type': 'closed', 'topic': 'history', 'answer': 'a'}]},
+        ]
+        response = self.app.post('/templates/bulk', json={'templates': templates}, headers=self.headers)
+        data = json.loads(response.data)
+        
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([failure['row'] for failure in data['failed']], [2, 3])
+        self.assertIn('Question 1', data['failed'][1]['message'])
+        with app.app_context():
+            self.assertEqual(Template.query.count(), 0)
+        
+        response = self.app.post('/templates/bulk', json={'templates': []}, headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+    
     def test_get_templates(self):
         """Test getting all templates for a user."""        
         # Create test templates
@@ -132,6 +190,138 @@ class TemplateRoutesTestCase(unittest.TestCase):
             template = Template.query.get(template_id)
             self.assertIsNone(template)
     
+    def _template_rows(self, template_id):
+        """Count the rows under a template in every table that references it."""
+        with app.app_context():
+            exam_ids = [exam_id for (exam_id,) in db.session.query(Exam.id).filter_by(template_id=template_id)]
+            return {
+                'exam': len(exam_ids),
+                'question': Question.query.filter(Question.exam_id.in_(exam_ids)).count(),
+                'stat': Stat.query.filter_by(template_id=template_id).count(),
+                'answer_event': AnswerEvent.query.filter_by(template_id=template_id).count(),
+                'daily_topic_stat': DailyTopicStat.query.filter_by(template_id=template_id).count(),
+                'template_topic': db.session.query(template_topic).filter_by(template_id=template_id).count(),
+            }
+    
+    def test_delete_template_cascades(self):
+        """Test that deleting a template removes everything under it, and only that."""
+        template_id, exam_id, question_id = self._add_exam_question()
+        kept_template_id, kept_exam_id, kept_question_id = self._add_exam_question(topic='science')
+        for exam, question in ((exam_id, question_id), (kept_exam_id, kept_question_id)):
+            self.app.post(f'/exams/{exam}/questions/{question}/answer', json={'answer': '42'}, headers=self.headers)
+        kept_rows = self._template_rows(kept_template_id)
+        self.assertTrue(all(self._template_rows(template_id).values()))
+        
+        response = self.app.delete(f'/templates/{template_id}', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        
+        self.assertFalse(any(self._template_rows(template_id).values()))
+        self.assertEqual(self._template_rows(kept_template_id), kept_rows)
+        response = self.app.get(f'/exams/{exam_id}', headers=self.headers)
+        self.assertEqual(response.status_code, 404)
+    
+    def test_delete_template_in_background(self):
+        """Test that a background delete answers 202 and purges the template in batches."""
+        template_id, exam_id, _ = self._add_exam_question()
+        with app.app_context():
+            db.session.add_all([
+                Question(type='open', topic='math', answer=str(i), exam_id=exam_id) for i in range(5)
+            ])
+            db.session.commit()
+        
+        futures = []
+        def start(*args, **kwargs):
+            futures.append(deletion.delete_template_in_background(*args, **kwargs))
+            return futures[-1]
+        
+        batch_size = app.config['TEMPLATE_DELETE_BATCH_SIZE']
+        app.config['TEMPLATE_DELETE_BATCH_SIZE'] = 2
+        try:
+            with mock.patch('template_module.delete_template_in_background', side_effect=start):
+                response = self.app.delete(f'/templates/{template_id}?background=true', headers=self.headers)
+            self.assertEqual(response.status_code, 202)
+            # Wait for the worker; 6 questions and the exam, in batches of 2
+            self.assertEqual(futures[0].result(timeout=10), 7)
+        finally:
+            app.config['TEMPLATE_DELETE_BATCH_SIZE'] = batch_size
+        
+        self.assertFalse(any(self._template_rows(template_id).values()))
+        with app.app_context():
+            self.assertIsNone(db.session.get(Template, template_id))
+    
+    def test_template_being_deleted_is_hidden(self):
+        """Test that a template flagged for a background delete can no longer be read or written."""
+        template_id, exam_id, question_id = self._add_exam_question()
+        with mock.patch('template_module.delete_template_in_background') as start:
+            response = self.app.delete(f'/templates/{template_id}?background=true', headers=self.headers)
+        self.assertEqual(response.status_code, 202)
+        start.assert_called_once()
+        with app.app_context():
+            # Flagged in the request's own transaction, before the worker is asked
+            self.assertTrue(db.session.get(Template, template_id).deleting)
+        
+        for url in (f'/templates/{template_id}', f'/templates/{template_id}/exams',
+                    f'/templates/{template_id}/stats', f'/exams/{exam_id}'):
+            self.assertEqual(self.app.get(url, headers=self.headers).status_code, 404, url)
+        self.assertEqual(json.loads(self.app.get('/templates', headers=self.headers).data), [])
+        self.assertEqual(json.loads(self.app.get('/exams', headers=self.headers).data), [])
+        response = self.app.put(f'/templates/{template_id}', json={'topics': 'history'}, headers=self.headers)
+        self.assertEqual(response.status_code, 404)
+        response = self.app.post(f'/templates/{template_id}/exams', headers=self.headers)
+        self.assertEqual(response.status_code, 404)
+        response = self.app.post(f'/exams/{exam_id}/questions/{question_id}/answer', json={'answer': '42'}, headers=self.headers)
+        self.assertEqual(response.status_code, 404)
+    
+    def test_resume_template_deletes(self):
+        """Test that templates left flagged by a stopped worker are deleted on resume."""
+        template_id, _, _ = self._add_exam_question()
+        kept_template_id, _, _ = self._add_exam_question(topic='science')
+        kept_rows = self._template_rows(kept_template_id)
+        with app.app_context():
+            db.session.get(Template, template_id).deleting = True
+            db.session.commit()
+        
+        result = app.test_cli_runner().invoke(args=['resume-template-deletes'])
+        self.assertIn('Deleted 1 templates', result.output)
+        
+        self.assertFalse(any(self._template_rows(template_id).values()))
+        self.assertEqual(self._template_rows(kept_template_id), kept_rows)
+        with app.app_context():
+            self.assertIsNone(db.session.get(Template, template_id))
+            self.assertEqual(deletion.flagged_template_ids(), [])
+    
+    def test_purge_changes_etags(self):
+        """Test that every batch of a background delete changes the template's and the user's ETags."""
+        template_id, exam_id, _ = self._add_exam_question()
+        responses = [self.app.get(url, headers=self.headers) for url in (f'/templates/{template_id}', '/exams')]
+        
+        with app.app_context():
+            self.assertEqual(deletion.purge_template_children(template_id, 1), 2)
+        
+        for response, url in zip(responses, (f'/templates/{template_id}', '/exams')):
+            response = self.app.get(url, headers={**self.headers, 'If-None-Match': response.headers['ETag']})
+            self.assertEqual(response.status_code, 200, url)
+        with app.app_context():
+            # One bump per batch: the question, then the exam
+            self.assertEqual(db.session.get(Template, template_id).version, 3)
+        self.assertEqual(json.loads(response.data), [])
+
+    def test_recreated_template_changes_etags(self):
+        """Test that a template reusing a deleted one's id does not reuse its ETags."""
+        template_id, exam_id, _ = self._add_exam_question()
+        urls = [f'/templates/{template_id}', f'/templates/{template_id}/exams', f'/exams/{exam_id}']
+        etags = {url: self.app.get(url, headers=self.headers).headers['ETag'] for url in urls}
+
+        response = self.app.delete(f'/templates/{template_id}', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        # SQLite hands the highest rowid out again, and versions restart at 1
+        self.assertEqual(self._add_exam_question(topic='science')[:2], (template_id, exam_id))
+
+        for url in urls:
+            response = self.app.get(url, headers={**self.headers, 'If-None-Match': etags[url]})
+            self.assertEqual(response.status_code, 200, url)
+            self.assertNotEqual(response.headers['ETag'], etags[url])
+
     def test_create_exam_from_template(self):
         """Test creating an exam from a template."""        
         # Create test template
@@ -179,6 +369,95 @@ class TemplateRoutesTestCase(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(len(data), 3)  # Should return all 3 exams
     
+    def _count_queries(self, request):
+        """Run a request and return (response, number of SQL statements it issued)."""
+        response, statements = self._record_queries(request)
+        return response, len(statements)
+    
+    def _record_queries(self, request):
+        """Run a request and return (response, the SQL statements it issued)."""
+        statements = []
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', record)
+        try:
+            response = request()
+        finally:
+            event.remove(engine, 'before_cursor_execute', record)
+        return response, statements
+    
+    def _add_templates_with_exams(self, count):
+        with app.app_context():
+            for i in range(count):
+                template = Template(topics=f'topic{i}', user_id=self.user.id)
+                db.session.add(template)
+                db.session.commit()
+                exam = Exam(template_id=template.id)
+                db.session.add(exam)
+                db.session.commit()
+                db.session.add(Question(type='open', topic=f'topic{i}', answer='42', exam_id=exam.id))
+                db.session.commit()
+    
+    def test_get_user_exams_query_count(self):
+        """Test that listing exams costs the same number of queries however many templates there are."""
+        self._add_templates_with_exams(1)
+        # Warm the user and revocation caches, and keep the latter from refreshing mid-test,
+        # so only the listing itself is counted
+        refresh_seconds = app.config['REVOCATION_CACHE_REFRESH_SECONDS']
+        app.config['REVOCATION_CACHE_REFRESH_SECONDS'] = 3600
+        try:
+            self.app.get('/exams', headers=self.headers)
+            
+            response, few_templates = self._count_queries(lambda: self.app.get('/exams', headers=self.headers))
+            self.assertEqual(len(json.loads(response.data)), 1)
+            
+            self._add_templates_with_exams(10)
+            response, many_templates = self._count_queries(lambda: self.app.get('/exams', headers=self.headers))
+            data = json.loads(response.data)
+        finally:
+            app.config['REVOCATION_CACHE_REFRESH_SECONDS'] = refresh_seconds
+        
+        self.assertEqual(len(data), 11)
+        self.assertTrue(all(exam['question_count'] == 1 for exam in data))
+        self.assertEqual(many_templates, few_templates)
+    
+    def _follow_pages(self, url):
+        """Request url and every page its Link headers point to; return the pages' items."""
+        pages = []
+        while url:
+            response = self.app.get(url, headers=self.headers)
+            self.assertEqual(response.status_code, 200)
+            pages.append(json.loads(response.data))
+            link = response.headers.get('Link')
+            url = link[link.index('<') + 1:link.index('>')] if link else None
+        return pages
+    
+    def test_list_pagination(self):
+        """Test that list endpoints page with ?limit= and a Link header to the next page."""
+        self._add_templates_with_exams(3)
+        with app.app_context():
+            template_id = Template.query.filter_by(user_id=self.user.id).order_by(Template.id).first().id
+            db.session.add(Exam(template_id=template_id))
+            db.session.commit()
+        
+        pages = self._follow_pages('/templates?limit=2')
+        self.assertEqual([len(page) for page in pages], [2, 1])
+        self.assertEqual(len({template['id'] for page in pages for template in page}), 3)
+        
+        # Exams are ordered by template, then exam, across the composite cursor
+        pages = self._follow_pages('/exams?limit=1')
+        self.assertEqual([len(page) for page in pages], [1, 1, 1, 1])
+        exams = [(exam['template_id'], exam['id']) for page in pages for exam in page]
+        self.assertEqual(exams, sorted(exams))
+        
+        pages = self._follow_pages(f'/templates/{template_id}/exams?limit=1')
+        self.assertEqual([len(page) for page in pages], [1, 1])
+        
+        response = self.app.get('/exams?after=bogus', headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+    
     def test_get_template_exams(self):
         """Test retrieving exams for a specific template."""        
         # Create test template and exams
@@ -245,6 +524,84 @@ class TemplateRoutesTestCase(unittest.TestCase):
         # Check that no answers are included in the response
         for question in data['questions']:
             self.assertNotIn('answer', question)
+        # Stored options come back as JSON values, not as strings holding JSON
+        self.assertEqual([question['options'] for question in data['questions']], [['10', '42', '100', '1000'], None])
+    
+    def test_sparse_fieldsets(self):
+        """Test that ?include= and ?fields= limit what is returned and what is read."""
+        self._add_templates_with_exams(1)
+        with app.app_context():
+            template = Template.query.filter_by(user_id=self.user.id).first()
+            template_id, exam_id = template.id, template.exams[0].id
+            question_id = template.exams[0].questions[0].id
+            db.session.add(Stat(topic='topic0', difficulty=5.0, trend=0.0, template_id=template_id))
+            db.session.commit()
+        
+        response = self.app.get(f'/templates/{template_id}?include=exams', headers=self.headers)
+        data = json.loads(response.data)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('stats', data)
+        self.assertEqual(data['exams'], [{'id': exam_id}])
+        
+        response = self.app.get(f'/templates/{template_id}', headers=self.headers)
+        self.assertEqual(len(json.loads(response.data)['stats']), 1)
+        
+        response, statements = self._record_queries(
+            lambda: self.app.get(f'/exams/{exam_id}?fields=id,topic', headers=self.headers)
+        )
+        self.assertEqual(json.loads(response.data)['questions'], [{'id': question_id, 'topic': 'topic0'}])
+        self.assertFalse(any('question.answer' in statement for statement in statements))
+        
+        response = self.app.get(f'/exams/{exam_id}?include=', headers=self.headers)
+        self.assertNotIn('questions', json.loads(response.data))
+        
+        response = self.app.get(f'/exams/{exam_id}?fields=answer', headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+    
+    def test_conditional_get(self):
+        """Test that read routes answer If-None-Match with 304 until a write changes their payload."""
+        self._add_templates_with_exams(1)
+        with app.app_context():
+            template = Template.query.filter_by(user_id=self.user.id).first()
+            template_id, exam_id = template.id, template.exams[0].id
+            question_id = template.exams[0].questions[0].id
+        
+        urls = ['/templates', '/exams', f'/templates/{template_id}', f'/templates/{template_id}/exams',
+                f'/templates/{template_id}/stats', f'/exams/{exam_id}']
+        etags = {}
+        for url in urls:
+            response = self.app.get(url, headers=self.headers)
+            self.assertEqual(response.status_code, 200)
+            etags[url] = response.headers['ETag']
+            
+            response = self.app.get(url, headers={**self.headers, 'If-None-Match': etags[url]})
+            self.assertEqual(response.status_code, 304, url)
+            self.assertEqual(response.data, b'')
+        
+        # A different query string is a different representation
+        response = self.app.get(f'/exams/{exam_id}?fields=id', headers={**self.headers, 'If-None-Match': etags[f'/exams/{exam_id}']})
+        self.assertEqual(response.status_code, 200)
+        
+        # Answering a question changes only the payloads that carry stats
+        with app.app_context():
+            version = db.session.get(Template, template_id).version
+        self.app.post(f'/exams/{exam_id}/questions/{question_id}/answer', json={'answer': '42'}, headers=self.headers)
+        stats_urls = (f'/templates/{template_id}', f'/templates/{template_id}/stats')
+        for url in urls:
+            response = self.app.get(url, headers={**self.headers, 'If-None-Match': etags[url]})
+            self.assertEqual(response.status_code, 200 if url in stats_urls else 304, url)
+        response = self.app.get(f'/templates/{template_id}?include=exams', headers=self.headers)
+        response = self.app.get(f'/templates/{template_id}?include=exams', headers={**self.headers, 'If-None-Match': response.headers['ETag']})
+        self.assertEqual(response.status_code, 304)
+        with app.app_context():
+            # No write to the template row per answer
+            self.assertEqual(db.session.get(Template, template_id).version, version)
+        
+        # Adding an exam changes the lists as well
+        self.app.post(f'/templates/{template_id}/exams', headers=self.headers)
+        response = self.app.get('/exams', headers={**self.headers, 'If-None-Match': etags['/exams']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(response.data)), 2)
     
     def test_template_stats(self):
         """Test retrieving stats for a template."""        
@@ -363,6 +720,173 @@ class TemplateRoutesTestCase(unittest.TestCase):
             self.assertGreater(stat.difficulty, 4.5)  # Difficulty should increase for incorrect answers
             self.assertEqual(stat.trend, 'increasing')
     
+    def test_submit_answers(self):
+        """Test grading a whole exam in one request with one commit."""
+        with app.app_context():
+            template = Template(topics='math,science', user_id=self.user.id)
+            db.session.add(template)
+            db.session.commit()
+            exam = Exam(template_id=template.id)
+            db.session.add(exam)
+            db.session.commit()
+            questions = [
+                Question(type='open', topic='math', answer='42', exam_id=exam.id),
+                Question(type='open', topic='math', answer='7', exam_id=exam.id),
+                Question(type='open', topic='science', answer='Cell', exam_id=exam.id),
+            ]
+            db.session.add_all(questions)
+            db.session.commit()
+            template_id, exam_id = template.id, exam.id
+            question_ids = [question.id for question in questions]
+        
+        answers = [
+            {'question_id': question_ids[0], 'answer': '42.0'},
+            {'question_id': question_ids[1], 'answer': '8'},
+            {'question_id': question_ids[2], 'answer': ' cell.'},
+        ]
+        commits = []
+        with app.app_context():
+            engine = db.engine
+        record = lambda conn: commits.append(conn)
+        event.listen(engine, 'commit', record)
+        try:
+            response = self.app.post(f'/exams/{exam_id}/answers', json={'answers': answers}, headers=self.headers)
+        finally:
+            event.remove(engine, 'commit', record)
+        data = json.loads(response.data)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['is_correct'] for result in data['results']], [True, False, True])
+        self.assertEqual((data['correct'], data['total']), (2, 3))
+        self.assertEqual(len(commits), 1)
+        
+        with app.app_context():
+            stats = {stat.topic: stat.difficulty for stat in Stat.query.filter_by(template_id=template_id)}
+            # math: 5.0 - 0.5 + 1.0, science: 5.0 - 0.5
+            self.assertEqual(stats, {'math': 5.5, 'science': 4.5})
+        
+        # A question from another exam rejects the whole batch
+        response = self.app.post(f'/exams/{exam_id}/answers',
+                                 json={'answers': [{'question_id': question_ids[0], 'answer': '42'},
+                                                   {'question_id': 999, 'answer': 'x'}]},
+                                 headers=self.headers)
+        self.assertEqual(response.status_code, 404)
+        with app.app_context():
+            self.assertEqual(Stat.query.filter_by(template_id=template_id, topic='math').first().difficulty, 5.5)
+        
+        response = self.app.post(f'/exams/{exam_id}/answers', json={'answers': []}, headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+    
+    def _add_exam_question(self, topic='math', answer='42'):
+        with app.app_context():
+            template = Template(topics=topic, user_id=self.user.id)
+            db.session.add(template)
+            db.session.commit()
+            exam = Exam(template_id=template.id)
+            db.session.add(exam)
+            db.session.commit()
+            question = Question(type='open', topic=topic, answer=answer, exam_id=exam.id)
+            db.session.add(question)
+            db.session.commit()
+            return template.id, exam.id, question.id
+    
+    def test_answer_authorization(self):
+        """Test that answer routes resolve ownership in one query and check the question belongs to the exam."""
+        template_id, exam_id, question_id = self._add_exam_question()
+        _, other_exam_id, other_question_id = self._add_exam_question(topic='science')
+        
+        # Warm the topic, user and revocation caches, and keep the latter from refreshing mid-test
+        refresh_seconds = app.config['REVOCATION_CACHE_REFRESH_SECONDS']
+        app.config['REVOCATION_CACHE_REFRESH_SECONDS'] = 3600
+        try:
+            self.app.post(f'/exams/{exam_id}/questions/{question_id}/answer', json={'answer': '42'}, headers=self.headers)
+            response, statements = self._record_queries(lambda: self.app.post(
+                f'/exams/{exam_id}/questions/{question_id}/answer', json={'answer': '42'}, headers=self.headers
+            ))
+        finally:
+            app.config['REVOCATION_CACHE_REFRESH_SECONDS'] = refresh_seconds
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len([statement for statement in statements if statement.lstrip().startswith('SELECT')]), 1)
+        
+        # A question of another exam is not found, even though both belong to this user
+        for action, body in (('answer', {'answer': '42'}), ('clarify', None)):
+            response = self.app.post(f'/exams/{exam_id}/questions/{other_question_id}/{action}',
+                                     json=body, headers=self.headers)
+            self.assertEqual(response.status_code, 404)
+            self.assertEqual(json.loads(response.data)['message'], 'Question not found')
+        
+        response = self.app.post(f'/exams/999/questions/{question_id}/answer', json={'answer': '42'}, headers=self.headers)
+        self.assertEqual(json.loads(response.data)['message'], 'Exam not found')
+        
+        with app.app_context():
+            other = User(username='other', password='password123', email='other@example.com')
+            db.session.add(other)
+            db.session.commit()
+            headers = {'Authorization': f'Bearer {create_access_token(identity=other.username)}'}
+        response = self.app.post(f'/exams/{exam_id}/questions/{question_id}/answer', json={'answer': '42'}, headers=headers)
+        self.assertEqual(response.status_code, 403)
+        response = self.app.get(f'/exams/{exam_id}', headers=headers)
+        self.assertEqual(response.status_code, 403)
+    
+    def test_concurrent_answers_are_not_lost(self):
+        """Test that answers submitted at the same time all count towards the stat and the event log."""
+        template_id, exam_id, question_id = self._add_exam_question()
+        barrier = threading.Barrier(4)
+        statuses = []
+        def answer():
+            client = app.test_client()
+            barrier.wait()
+            response = client.post(f'/exams/{exam_id}/questions/{question_id}/answer',
+                                   json={'answer': 'wrong'}, headers=self.headers)
+            statuses.append(response.status_code)
+        threads = [threading.Thread(target=answer) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(statuses, [200] * 4)
+        with app.app_context():
+            stat = Stat.query.filter_by(template_id=template_id).one()
+            self.assertEqual(stat.difficulty, 9.0)
+            self.assertEqual(stat.trend, 'increasing')
+            events = AnswerEvent.query.filter_by(template_id=template_id).all()
+            self.assertEqual(len(events), 4)
+            self.assertTrue(all(event.kind == 'answer' and not event.is_correct for event in events))
+    
+    def test_answers_to_one_topic_on_batching_dialects(self):
+        """Test that answers to one topic compound where executemany would become one multi-row INSERT."""
+        template_id, exam_id, question_id = self._add_exam_question()
+        with app.app_context():
+            dialect = db.engine.dialect
+        answers = [{'question_id': question_id, 'answer': answer} for answer in ('42', 'wrong', 'wrong')]
+        with mock.patch.object(dialect, 'use_insertmanyvalues_wo_returning', True):
+            response = self.app.post(f'/exams/{exam_id}/answers', json={'answers': answers}, headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        
+        with app.app_context():
+            stat = Stat.query.filter_by(template_id=template_id, topic='math').one()
+            # 5.0 - 0.5 + 1.0 + 1.0
+            self.assertEqual((stat.difficulty, stat.trend), (6.5, 'increasing'))
+    
+    def test_stats_without_upsert(self):
+        """Test the update-then-insert path used on databases without INSERT ... ON CONFLICT."""
+        template_id, exam_id, question_id = self._add_exam_question()
+        with mock.patch('answers._dialect_insert', return_value=None):
+            for answer in ('42', '42', 'wrong'):
+                self.app.post(f'/exams/{exam_id}/questions/{question_id}/answer',
+                              json={'answer': answer}, headers=self.headers)
+            self.app.post(f'/exams/{exam_id}/questions/{question_id}/clarify', headers=self.headers)
+        
+        with app.app_context():
+            stat = Stat.query.filter_by(template_id=template_id).one()
+            # 5.0 - 0.5 - 0.5 + 1.0 + 1.0
+            self.assertEqual((stat.difficulty, stat.trend), (6.0, 'increasing'))
+            kinds = [event.kind for event in AnswerEvent.query.filter_by(template_id=template_id).order_by(AnswerEvent.id)]
+            self.assertEqual(kinds, ['answer'] * 3 + ['clarification'])
+            rollup = DailyTopicStat.query.filter_by(template_id=template_id).one()
+            self.assertEqual((rollup.attempts, rollup.correct, rollup.difficulty), (4, 2, 6.0))
+    
     def test_request_clarification(self):
         """Test requesting clarification for a question."""        
         # Store template ID rather than template object
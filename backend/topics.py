@@ -0,0 +1,129 @@
+from sqlalchemy import event, inspect, select, delete, insert
+
+from main import db
+from models import Topic, Template, Stat, Question, template_topic
+from cache import TTLCache
+
+# Topic names never change once interned, so ids can be reused across requests
+topic_cache = TTLCache(maxsize=10000, ttl=600)
+
+def split_topics(topics):
+    """Split a comma-separated topic list into unique, stripped names."""
+    names = []
+    for name in (topics or '').split(','):
+        name = name.strip()
+        if name and name not in names:
+            names.append(name)
+    return names
+
+def _insert_ignore_duplicates(session, table, rows):
+    """Insert rows, skipping any that would violate a unique constraint."""
+    dialect = session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        dialect_insert = None
+
+    if dialect_insert is not None:
+        session.execute(dialect_insert(table).on_conflict_do_nothing(), rows)
+    else:
+        session.execute(insert(table).prefix_with('IGNORE'), rows)
+
+def _pending_topics(session):
+    """Ids of topics inserted in the session's open transaction, by name."""
+    return session.info.setdefault('pending_topics', {})
+
+def intern_topics(names, session=None):
+    """Return topic ids for names, creating topics that do not exist yet.
+
+    Ids of topics created here are only cached once the transaction commits;
+    a rolled back id may be handed to another topic later.
+    """
+    session = session or db.session
+    pending = _pending_topics(session)
+    ids = {name: topic_cache.get(name) or pending.get(name) for name in names}
+    missing = [name for name, topic_id in ids.items() if topic_id is None]
+
+    if missing:
+        with session.no_autoflush:
+            for name, topic_id in session.execute(select(Topic.name, Topic.id).where(Topic.name.in_(missing))):
+                ids[name] = topic_id
+                topic_cache.set(name, topic_id)
+
+            new = [name for name in missing if ids[name] is None]
+            if new:
+                _insert_ignore_duplicates(session, Topic.__table__, [{'name': name} for name in new])
+                for name, topic_id in session.execute(select(Topic.name, Topic.id).where(Topic.name.in_(new))):
+                    ids[name] = topic_id
+                    pending[name] = topic_id
+
+    return [ids[name] for name in names]
+
+def intern_topic(name, session=None):
+    return intern_topics([name], session)[0]
+
+def link_template_topics(session, template_topics):
+    """Replace the template_topic rows of each template id with its parsed topic list."""
+    template_ids = list(template_topics)
+    if not template_ids:
+        return
+
+    session.execute(delete(template_topic).where(template_topic.c.template_id.in_(template_ids)))
+    names_by_template = {template_id: split_topics(topics) for template_id, topics in template_topics.items()}
+    # Interned together, so many templates cost one lookup rather than one each
+    names = list(dict.fromkeys(name for names in names_by_template.values() for name in names))
+    id_by_name = dict(zip(names, intern_topics(names, session)))
+    rows = []
+    for template_id, names in names_by_template.items():
+        for name in names:
+            rows.append({'template_id': template_id, 'topic_id': id_by_name[name]})
+    if rows:
+        session.execute(insert(template_topic), rows)
+
+def _topic_changed(obj):
+    return obj.topic_id is None or inspect(obj).attrs.topic.history.has_changes()
+
+@event.listens_for(db.session, 'before_flush')
+def _intern_topics_before_flush(session, flush_context, instances):
+    """Fill topic_id for stats and questions whose topic name is new or changed."""
+    pending = [
+        obj for obj in list(session.new) + list(session.dirty)
+        if isinstance(obj, (Stat, Question)) and _topic_changed(obj)
+    ]
+    if pending:
+        names = list({obj.topic for obj in pending})
+        id_by_name = dict(zip(names, intern_topics(names, session)))
+        for obj in pending:
+            obj.topic_id = id_by_name[obj.topic]
+
+    # Templates only get their ids during the flush, so link them afterwards
+    templates = session.info.setdefault('templates_to_link', set())
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Template) and inspect(obj).attrs.topics.history.has_changes():
+            templates.add(obj)
+
+@event.listens_for(db.session, 'after_flush')
+def _link_template_topics_after_flush(session, flush_context):
+    templates = session.info.pop('templates_to_link', set())
+    link_template_topics(session, {template.id: template.topics for template in templates})
+
+    # Deleted templates take their links with them
+    deleted = [obj.id for obj in session.deleted if isinstance(obj, Template)]
+    if deleted:
+        session.execute(delete(template_topic).where(template_topic.c.template_id.in_(deleted)))
+
+@event.listens_for(db.session, 'after_commit')
+def _cache_committed_topics(session):
+    for name, topic_id in session.info.pop('pending_topics', {}).items():
+        topic_cache.set(name, topic_id)
+
+# Soft rollbacks include savepoints, which may have undone the inserts too
+@event.listens_for(db.session, 'after_soft_rollback')
+def _forget_pending_topics(session, previous_transaction):
+    session.info.pop('pending_topics', None)
+
+@event.listens_for(Topic.__table__, 'after_drop')
+def _forget_topics(target, connection, **kw):
+    topic_cache.clear()